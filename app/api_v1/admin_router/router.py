@@ -0,0 +1,34 @@
+from typing import Literal
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from app.helpers.middlewares import require_api_key
+from app.helpers.profiler import LOOP_PROFILER
+from app.settings import APP_SETTINGS
+
+admin_router = APIRouter(
+    prefix="/admin",
+    tags=["Admin"],
+    dependencies=[Depends(require_api_key)],
+)
+
+
+@admin_router.get("/profile")
+async def profile(seconds: float = Query(default=10, gt=0, le=APP_SETTINGS.PROFILER.MAX_SECONDS),
+                  format: Literal["collapsed", "speedscope"] = "collapsed",
+                  interval_ms: float = Query(default=APP_SETTINGS.PROFILER.INTERVAL_MS, ge=1, le=1000)):
+    _session = await LOOP_PROFILER.profile(seconds, interval_ms=interval_ms)
+    if format == "speedscope":
+        return JSONResponse(
+            _session.speedscope(),
+            headers={"Content-Disposition": 'attachment; filename="profile.speedscope.json"'},
+        )
+    return PlainTextResponse(_session.collapsed())
+
+
+@admin_router.get("/loop-lag")
+async def loop_lag(seconds: float = Query(default=10, gt=0, le=APP_SETTINGS.PROFILER.MAX_SECONDS),
+                   slow_callback_ms: float = Query(default=APP_SETTINGS.PROFILER.SLOW_CALLBACK_MS, gt=0)):
+    _session = await LOOP_PROFILER.profile(seconds, slow_callback_ms=slow_callback_ms)
+    return _session.loop_report()
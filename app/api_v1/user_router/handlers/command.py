@@ -1,11 +1,34 @@
+from typing import AsyncIterator
+
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.api_v1.user_router.repository.aggregate import UserAggregate
 from app.api_v1.user_router.repository.crud import UserRepository
 from app.api_v1.user_router.repository.models import User
+from app.helpers.event_store import EventStore
+from app.helpers.tracing import traced_class
 
 
+@traced_class("handler")
 class UserCommandHandler:
     @staticmethod
     async def create_user(db: AsyncSession, user: User):
         _user = await UserRepository.create_user(db, user)
         return _user
+
+    @staticmethod
+    def create_users(db: AsyncSession, users: list[dict]) -> AsyncIterator[list[User]]:
+        return UserRepository.create_users(db, users)
+
+    @staticmethod
+    async def create_users_batch(db: AsyncSession, users: list[dict]) -> list[User | Exception]:
+        _users = await UserRepository.create_users_batch(db, users)
+        return _users
+
+    @staticmethod
+    async def append_created_events(db: AsyncSession, users: list[dict]):
+        await EventStore.save_many(db, [UserAggregate.create(user) for user in users])
+
+    @staticmethod
+    async def copy_users(db: AsyncSession, records: list[tuple], columns: list[str]):
+        await UserRepository.copy_users(db, records, columns)
@@ -1,13 +1,39 @@
+import datetime
 import uuid
+from typing import Awaitable, Callable
 
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncScalarResult, AsyncSession
 
 from app.api_v1.user_router.repository.crud import UserRepository
 from app.api_v1.user_router.repository.models import User
+from app.helpers.tracing import traced_class
 
 
+@traced_class("handler")
 class UserQueryHandler:
     @staticmethod
     async def get_user(db: AsyncSession, user_uuid: uuid.UUID) -> User:
         _user = await UserRepository.get_user(db, user_uuid)
         return _user
+
+    @staticmethod
+    async def get_users(db: AsyncSession, user_uuids: list[uuid.UUID]) -> list[User]:
+        _users = await UserRepository.get_users(db, user_uuids)
+        return _users
+
+    @staticmethod
+    async def list_users(
+            db: AsyncSession,
+            limit: int,
+            after: tuple[datetime.datetime, uuid.UUID] | None = None,
+    ) -> list[User]:
+        _users = await UserRepository.list_users(db, limit, after)
+        return _users
+
+    @staticmethod
+    async def stream_users(db: AsyncSession, batch_size: int) -> AsyncScalarResult[User]:
+        return await UserRepository.stream_users(db, batch_size)
+
+    @staticmethod
+    async def copy_users_to(db: AsyncSession, output: Callable[[bytes], Awaitable] | str):
+        await UserRepository.copy_users_to(db, output)
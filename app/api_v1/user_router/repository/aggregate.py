@@ -0,0 +1,41 @@
+import uuid
+
+from app.helpers.event_store import Aggregate
+
+
+class UserAggregate(Aggregate):
+    aggregate_type = "user"
+
+    def __init__(self, aggregate_id: uuid.UUID):
+        super().__init__(aggregate_id)
+        self.name: str | None = None
+        self.email: str | None = None
+        self.phone: str | None = None
+
+    @classmethod
+    def create(cls, user: dict) -> "UserAggregate":
+        _aggregate = cls(user["uuid"])
+        _aggregate.record(
+            "user_created",
+            {"name": user["name"], "email": user["email"], "phone": user["phone"]},
+        )
+        return _aggregate
+
+    def update(self, **changes):
+        self.record("user_updated", changes)
+
+    def apply(self, event_type: str, payload: dict):
+        if event_type in ("user_created", "user_updated"):
+            for _field in ("name", "email", "phone"):
+                if _field in payload:
+                    setattr(self, _field, payload[_field])
+        else:
+            raise ValueError(f"Unknown user event {event_type}")
+
+    def snapshot(self) -> dict:
+        return {"name": self.name, "email": self.email, "phone": self.phone}
+
+    def restore(self, state: dict):
+        self.name = state["name"]
+        self.email = state["email"]
+        self.phone = state["phone"]
@@ -1,27 +1,140 @@
 import uuid
+import datetime
+from typing import AsyncIterator, Awaitable, Callable
 
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncScalarResult, AsyncSession
+from sqlalchemy import any_, bindparam, insert, select, tuple_
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
 
 from app.api_v1.user_router.repository.models import User
+from app.helpers.exceptions import ServiceException
+from app.helpers.tracing import traced_class
+from app.settings import APP_SETTINGS
 
 
+@traced_class("repository")
 class UserRepository:
 
     @staticmethod
     async def _insert_instance(instance, db: AsyncSession):
+        # server defaults are fetched by the INSERT ... RETURNING itself,
+        # so there is no need for an extra refresh round trip
         db.add(instance)
         await db.commit()
-        await db.refresh(instance)
         return instance
 
+    @staticmethod
+    async def _insert_many(rows: list[dict], db: AsyncSession) -> list[User]:
+        _stmt = insert(User).values(rows).returning(User)
+        _users = await db.scalars(_stmt)
+        return list(_users)
+
     @staticmethod
     async def create_user(db: AsyncSession, user: User) -> User:
         _user = await UserRepository._insert_instance(user, db)
         return _user
 
+    @staticmethod
+    async def create_users(
+            db: AsyncSession,
+            users: list[dict],
+            chunk_size: int = APP_SETTINGS.DATABASE.BULK_INSERT_CHUNK_SIZE,
+    ) -> AsyncIterator[list[User]]:
+        """Insert users with one multi-row INSERT ... RETURNING per chunk.
+
+        Every chunk is its own transaction. It is yielded before commit so the caller
+        can add to the same transaction (e.g. outbox events), and committed when
+        iteration resumes.
+        """
+        for i in range(0, len(users), chunk_size):
+            _users = await UserRepository._insert_many(users[i:i + chunk_size], db)
+            yield _users
+            await db.commit()
+
+    @staticmethod
+    async def create_users_batch(db: AsyncSession, users: list[dict]) -> list[User | Exception]:
+        """Insert users in one transaction, returning a row or an error per input.
+
+        The batch is written with a single multi-row INSERT. If that fails, it is
+        retried row by row under savepoints so that one bad row only fails itself.
+        The transaction is left open for the caller to commit.
+        """
+        try:
+            _inserted = await UserRepository._insert_many(users, db)
+        except DBAPIError:
+            await db.rollback()
+        else:
+            _by_uuid = {u.uuid: u for u in _inserted}
+            return [_by_uuid[user["uuid"]] for user in users]
+
+        _results = []
+        for user in users:
+            try:
+                async with db.begin_nested():
+                    _results.extend(await UserRepository._insert_many([user], db))
+            except DBAPIError as e:
+                _results.append(e)
+        return _results
+
     @staticmethod
     async def get_user(db: AsyncSession, user_uuid: uuid.uuid4()) -> User:
         _stmt = select(User).where(User.uuid == user_uuid)  # type: ignore
         _user = await db.scalar(_stmt)
         return _user
+
+    @staticmethod
+    async def get_users(db: AsyncSession, user_uuids: list[uuid.UUID]) -> list[User]:
+        if db.bind.dialect.name == "postgresql":
+            # one array parameter keeps a single prepared statement for any number of ids
+            _ids = bindparam("ids", user_uuids, type_=ARRAY(UUID(as_uuid=True)))
+            _stmt = select(User).where(User.uuid == any_(_ids))
+        else:
+            _stmt = select(User).where(User.uuid.in_(user_uuids))
+        _users = await db.scalars(_stmt)
+        return list(_users)
+
+    @staticmethod
+    async def list_users(
+            db: AsyncSession,
+            limit: int,
+            after: tuple[datetime.datetime, uuid.UUID] | None = None,
+    ) -> list[User]:
+        _stmt = select(User).order_by(User.created_at, User.uuid).limit(limit)
+        if after is not None:
+            _stmt = _stmt.where(tuple_(User.created_at, User.uuid) > tuple_(*after))
+        _users = await db.scalars(_stmt)
+        return list(_users)
+
+    @staticmethod
+    async def stream_users(db: AsyncSession, batch_size: int) -> AsyncScalarResult[User]:
+        _stmt = (
+            select(User)
+            .order_by(User.created_at, User.uuid)
+            .execution_options(yield_per=batch_size)
+        )
+        return await db.stream_scalars(_stmt)
+
+    @staticmethod
+    async def _driver_connection(db: AsyncSession):
+        """The asyncpg connection behind ``db``, inside the session's transaction."""
+        if db.bind.dialect.name != "postgresql":
+            raise ServiceException(message="COPY is only supported on PostgreSQL")
+        _connection = await db.connection()
+        _raw = await _connection.get_raw_connection()
+        return _raw.driver_connection
+
+    @staticmethod
+    async def copy_users(db: AsyncSession, records: list[tuple], columns: list[str]):
+        _connection = await UserRepository._driver_connection(db)
+        await _connection.copy_records_to_table(User.__tablename__, records=records, columns=columns)
+
+    @staticmethod
+    async def copy_users_to(db: AsyncSession, output: Callable[[bytes], Awaitable] | str):
+        _stmt = select(User.uuid, User.name, User.email, User.phone, User.created_at).order_by(
+            User.created_at, User.uuid
+        )
+        _connection = await UserRepository._driver_connection(db)
+        await _connection.copy_from_query(
+            str(_stmt.compile(dialect=db.bind.dialect)), output=output, format="csv", header=True
+        )
@@ -1,10 +1,15 @@
+from sqlalchemy import Index
+from sqlalchemy.orm import Mapped, mapped_column
+
 from app.helpers.db import BaseModel
 
 
 class User(BaseModel):
-    name: str
-    email: str
-    phone: str
-
-
-
+    name: Mapped[str] = mapped_column(nullable=False)
+    email: Mapped[str] = mapped_column(nullable=False)
+    phone: Mapped[str] = mapped_column(nullable=False)
+
+    __table_args__ = (
+        # keyset pagination and exports walk users in (created_at, uuid) order
+        Index("ix_user_created_at_uuid", "created_at", "uuid"),
+    )
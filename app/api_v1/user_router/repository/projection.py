@@ -0,0 +1,36 @@
+from app.api_v1.user_router.repository.aggregate import UserAggregate
+from app.api_v1.user_router.repository.models import User
+from app.helpers.projections import Projection
+
+_FIELDS = ("name", "email", "phone")
+
+
+class UserProjection(Projection):
+    """Keeps the ``user`` table, which the queries read, in line with the user event stream.
+
+    Commands write their rows directly and append the matching events in the same
+    transaction, so applying those events again leaves the rows as they are.
+    """
+
+    name = "user"
+    aggregate_type = UserAggregate.aggregate_type
+    table = User.__table__
+
+    def rows(self, events: list) -> list[dict]:
+        _rows: dict = {}
+        for _event in events:
+            if _event.event_type == "user_created":
+                _rows[_event.aggregate_id] = {
+                    "uuid": _event.aggregate_id,
+                    **{f: _event.payload[f] for f in _FIELDS},
+                    "created_at": _event.created_at,
+                    "updated_at": _event.created_at,
+                }
+            elif _event.event_type == "user_updated":
+                _row = _rows.setdefault(_event.aggregate_id, {"uuid": _event.aggregate_id})
+                _row.update({f: _event.payload[f] for f in _FIELDS if f in _event.payload})
+                _row["updated_at"] = _event.created_at
+        return list(_rows.values())
+
+
+USER_PROJECTION = UserProjection()
@@ -1,12 +1,17 @@
-from fastapi import APIRouter, Depends
+from typing import Literal
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api_v1.user_router.schemas.body_schema import UserGet
-from app.api_v1.user_router.schemas.read_schema import UserRead
-from app.api_v1.user_router.schemas.write_schema import UserCreate
+from app.api_v1.user_router.schemas.body_schema import UserBatchGet, UserGet
+from app.api_v1.user_router.schemas.read_schema import UserBatchRead, UserPage, UserRead
+from app.api_v1.user_router.schemas.write_schema import UserBulkCreate, UserCreate
 from app.api_v1.user_router.services.command import UserCommandService
 from app.api_v1.user_router.services.query import UserQueryService
 from app.helpers.db import DB_HELPER
+from app.helpers.exceptions import NotFound
+from app.settings import APP_SETTINGS
 
 user_router = APIRouter(
     prefix="/user",
@@ -18,10 +23,45 @@ user_router = APIRouter(
 async def get_user(request: UserGet,
                    db: AsyncSession = Depends(DB_HELPER.scoped_session_dependency(db_name="replica"))):
     _user = await UserQueryService.get_user(db, user_uuid=request.user_id)
+    if _user is None:
+        raise NotFound(message="User not found")
     return _user
 
 
+@user_router.get("/list", response_model=UserPage)
+async def list_users(limit: int = Query(default=APP_SETTINGS.QUERY.USER_LIST_DEFAULT_LIMIT, ge=1,
+                                        le=APP_SETTINGS.QUERY.USER_LIST_MAX_LIMIT),
+                     cursor: str | None = None,
+                     db: AsyncSession = Depends(DB_HELPER.scoped_session_dependency(db_name="replica"))):
+    _page = await UserQueryService.list_users(db, limit=limit, cursor=cursor)
+    return _page
+
+
+@user_router.get("/export")
+async def export_users(format: Literal["ndjson", "csv"] = "ndjson"):
+    _media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        UserQueryService.export_users(format),
+        media_type=_media_type,
+        headers={"Content-Disposition": f'attachment; filename="users.{format}"'},
+    )
+
+
+@user_router.post("/batch", response_model=UserBatchRead)
+async def get_users(request: UserBatchGet,
+                    db: AsyncSession = Depends(DB_HELPER.scoped_session_dependency(db_name="replica"))):
+    _users = await UserQueryService.get_users(db, user_uuids=request.user_ids)
+    return _users
+
+
 @user_router.post("/user")
 async def create_user(user: UserCreate,
                       db: AsyncSession = Depends(DB_HELPER.scoped_session_dependency(db_name="primary"))):
     _user = await UserCommandService.create_user(db, user)
+
+
+@user_router.post("/bulk", response_model=list[UserRead])
+async def create_users(request: UserBulkCreate,
+                       db: AsyncSession = Depends(DB_HELPER.scoped_session_dependency(db_name="primary"))):
+    _users = await UserCommandService.create_users(db, request.users)
+    return _users
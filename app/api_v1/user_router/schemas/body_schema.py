@@ -1,7 +1,13 @@
 import uuid
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+
+from app.settings import APP_SETTINGS
 
 
 class UserGet(BaseModel):
     user_id: str | uuid.UUID
+
+
+class UserBatchGet(BaseModel):
+    user_ids: list[uuid.UUID] = Field(min_length=1, max_length=APP_SETTINGS.QUERY.USER_BATCH_MAX_IDS)
@@ -0,0 +1,16 @@
+import datetime
+import uuid
+
+from pydantic import BaseModel
+
+
+class UserEventUser(BaseModel):
+    uuid: uuid.UUID
+    name: str | None = None
+    email: str | None = None
+    phone: str | None = None
+    created_at: datetime.datetime | None = None
+
+
+class UserEvent(BaseModel):
+    users: list[UserEventUser] = []
@@ -1,8 +1,24 @@
-from pydantic import BaseModel
+import datetime
+import uuid
+
+from pydantic import BaseModel, ConfigDict
 
 
 class UserRead(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    uuid: uuid.UUID
     name: str
     email: str
     phone: str
-    created_at: str
+    created_at: datetime.datetime
+
+
+class UserBatchRead(BaseModel):
+    users: list[UserRead]
+    missing: list[uuid.UUID]
+
+
+class UserPage(BaseModel):
+    users: list[UserRead]
+    next_cursor: str | None = None
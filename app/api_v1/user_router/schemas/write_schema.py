@@ -1,7 +1,11 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class UserCreate(BaseModel):
     name: str
     email: str
     phone: str
+
+
+class UserBulkCreate(BaseModel):
+    users: list[UserCreate] = Field(min_length=1)
@@ -0,0 +1,112 @@
+import asyncio
+import csv
+import itertools
+import time
+import uuid
+from contextlib import asynccontextmanager
+
+from pydantic import TypeAdapter, ValidationError
+
+from app.api_v1.user_router.handlers.command import UserCommandHandler
+from app.api_v1.user_router.handlers.query import UserQueryHandler
+from app.api_v1.user_router.schemas.write_schema import UserCreate
+from app.helpers.db import DB_HELPER
+from app.helpers.outbox import stage_event
+from app.settings import APP_SETTINGS
+
+_USERS = TypeAdapter(list[UserCreate])
+_COLUMNS = ["uuid", "name", "email", "phone"]
+
+
+class UserBulkService:
+    """COPY-based import and export of users for migrations and backfills."""
+
+    @staticmethod
+    def _validate(rows: list, first_line: int) -> tuple[list[UserCreate], list[str]]:
+        """Validate a chunk in one call, falling back to dropping just the bad rows."""
+        try:
+            return _USERS.validate_python(rows), []
+        except ValidationError as e:
+            _bad = {error["loc"][0] for error in e.errors()}
+            _errors = [f"line {first_line + i}: {rows[i]}" for i in sorted(_bad)]
+            _good = [row for i, row in enumerate(rows) if i not in _bad]
+            return _USERS.validate_python(_good), _errors
+
+    @staticmethod
+    def _read_chunk(reader, chunk_size: int, first_line: int):
+        _rows = list(itertools.islice(reader, chunk_size))
+        return _rows, *UserBulkService._validate(_rows, first_line)
+
+    @staticmethod
+    async def _import_chunk(users: list[UserCreate]):
+        _records = [(uuid.uuid4(), u.name, u.email, u.phone) for u in users]
+        _event_users = [dict(zip(_COLUMNS, record)) for record in _records]
+        async with asynccontextmanager(DB_HELPER.session_dependency(db_name="primary"))() as db:
+            await UserCommandHandler.copy_users(db, _records, _COLUMNS)
+            await UserCommandHandler.append_created_events(db, _event_users)
+            stage_event(
+                db,
+                'user_created',
+                {'users': [{**u, "uuid": str(u["uuid"])} for u in _event_users]},
+            )
+            await db.commit()
+
+    @staticmethod
+    async def import_users(path: str, chunk_size: int = APP_SETTINGS.DATABASE.BULK_COPY_CHUNK_SIZE) -> dict:
+        """Load users from a CSV file (``name,email,phone`` header) with COPY.
+
+        Every chunk is validated in one batch, copied, recorded in the event store
+        and announced with one ``user_created`` event, and committed on its own.
+        The next chunk is read and validated in a thread while the current one is
+        being copied. Invalid rows are skipped and reported.
+        """
+        _started = time.perf_counter()
+        _imported = 0
+        _errors: list[str] = []
+        with open(path, newline="") as _file:
+            _reader = csv.DictReader(_file)
+            _line = 2
+            _next = asyncio.create_task(
+                asyncio.to_thread(UserBulkService._read_chunk, _reader, chunk_size, _line)
+            )
+            try:
+                while True:
+                    _rows, _users, _chunk_errors = await _next
+                    if not _rows:
+                        break
+                    _line += len(_rows)
+                    _next = asyncio.create_task(
+                        asyncio.to_thread(UserBulkService._read_chunk, _reader, chunk_size, _line)
+                    )
+                    _errors.extend(_chunk_errors)
+                    if _users:
+                        await UserBulkService._import_chunk(_users)
+                        _imported += len(_users)
+            finally:
+                # a failed chunk leaves the read-ahead of the next one behind
+                _next.cancel()
+                await asyncio.gather(_next, return_exceptions=True)
+        _elapsed = time.perf_counter() - _started
+        return {
+            "imported": _imported,
+            "rejected": len(_errors),
+            "errors": _errors,
+            "seconds": _elapsed,
+            "rows_per_second": _imported / _elapsed if _elapsed else 0,
+        }
+
+    @staticmethod
+    async def export_users(path: str) -> dict:
+        """Dump every user to a CSV file with COPY, streamed from a replica."""
+        _started = time.perf_counter()
+        _written = 0
+        with open(path, "wb") as _file:
+
+            async def _write(chunk: bytes):
+                nonlocal _written
+                _written += len(chunk)
+                _file.write(chunk)
+
+            async with asynccontextmanager(DB_HELPER.session_dependency(db_name="replica"))() as db:
+                await UserQueryHandler.copy_users_to(db, _write)
+        return {"bytes": _written, "seconds": time.perf_counter() - _started}
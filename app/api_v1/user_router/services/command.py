@@ -1,35 +1,86 @@
 import uuid
+from contextlib import asynccontextmanager
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api_v1.user_router.handlers.command import UserCommandHandler
 from app.api_v1.user_router.repository.models import User
+from app.api_v1.user_router.schemas.read_schema import UserRead
 from app.api_v1.user_router.schemas.write_schema import UserCreate
+from app.helpers.command_bus import CommandBus
 from app.helpers.db import DB_HELPER
-from app.helpers.rabbitmq import publish_event, event
+from app.helpers.outbox import stage_event
+from app.helpers.tracing import traced_class
+from app.settings import APP_SETTINGS
 
 
+@traced_class("service")
 class UserCommandService:
     @staticmethod
-    @publish_event(event_name='user_created')
     async def create_user(db: AsyncSession, user: UserCreate) -> User:
-        _user_for_create = User(
-            name=user.name,
-            email=user.email,
-            phone=user.phone,
-            uuid=uuid.uuid4()
-        )
-        _user = await UserCommandHandler.create_user(db, _user_for_create)
+        _user_for_create = {
+            "uuid": uuid.uuid4(),
+            "name": user.name,
+            "email": user.email,
+            "phone": user.phone,
+        }
+        if APP_SETTINGS.COMMAND_BUS.ENABLED:
+            _user = await USER_CREATE_BUS.dispatch(_user_for_create)
+            DB_HELPER.mark_write()
+            return _user
+        _event_user = {**_user_for_create, "uuid": str(_user_for_create["uuid"])}
+        stage_event(db, 'user_created', {'users': [_event_user]})
+        await UserCommandHandler.append_created_events(db, [_user_for_create])
+        _user = await UserCommandHandler.create_user(db, User(**_user_for_create))
         return _user
 
-    @event.on('user_updated')
-    async def up_to_date_users(db: AsyncSession, user_info: dict) -> User:
-        ...
+    @staticmethod
+    async def _create_users_batch(users: list[dict]) -> list[User | Exception]:
+        async with asynccontextmanager(DB_HELPER.session_dependency(db_name="primary"))() as db:
+            _users = await UserCommandHandler.create_users_batch(db, users)
+            _created = [u for u in _users if isinstance(u, User)]
+            if _created:
+                stage_event(db, 'user_created', {'users': UserCommandService._event_users(_created)})
+                await UserCommandHandler.append_created_events(
+                    db, UserCommandService._user_fields(_created)
+                )
+            await db.commit()
+        return _users
 
-    @event.on('user_created')
-    async def _sync_user_with_replica(user: dict,
-                                      db: AsyncSession = DB_HELPER.scoped_session_dependency(
-                                          db_name="replica")) -> User:
-        _user_info = User(**user)
-        _user = await UserCommandHandler.create_user(db, _user_info)
-        return _user
+    @staticmethod
+    def _event_users(users: list[User]) -> list[dict]:
+        return [UserRead.model_validate(u).model_dump(mode="json") for u in users]
+
+    @staticmethod
+    def _user_fields(users: list[User]) -> list[dict]:
+        return [
+            {"uuid": u.uuid, "name": u.name, "email": u.email, "phone": u.phone} for u in users
+        ]
+
+    @staticmethod
+    async def create_users(db: AsyncSession, users: list[UserCreate]) -> list[User]:
+        _users_for_create = [
+            {
+                "uuid": uuid.uuid4(),
+                "name": user.name,
+                "email": user.email,
+                "phone": user.phone,
+            }
+            for user in users
+        ]
+        _created = []
+        async for _chunk in UserCommandHandler.create_users(db, _users_for_create):
+            stage_event(db, 'user_created', {'users': UserCommandService._event_users(_chunk)})
+            await UserCommandHandler.append_created_events(
+                db, UserCommandService._user_fields(_chunk)
+            )
+            _created.extend(_chunk)
+        return _created
+
+
+USER_CREATE_BUS = CommandBus(
+    handler=UserCommandService._create_users_batch,
+    max_batch_size=APP_SETTINGS.COMMAND_BUS.MAX_BATCH_SIZE,
+    max_wait_ms=APP_SETTINGS.COMMAND_BUS.MAX_WAIT_MS,
+    max_concurrent_batches=APP_SETTINGS.COMMAND_BUS.MAX_CONCURRENT_BATCHES,
+)
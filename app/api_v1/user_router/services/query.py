@@ -1,13 +1,157 @@
+import base64
+import csv
+import datetime
+import io
 import uuid
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import AsyncIterator, Literal
 
+import pydantic_core
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api_v1.user_router.handlers.query import UserQueryHandler
 from app.api_v1.user_router.repository.models import User
+from app.api_v1.user_router.schemas.event_schema import UserEvent
+from app.api_v1.user_router.schemas.read_schema import UserBatchRead, UserPage, UserRead
+from app.helpers.cache import LRUTTLCache, ReadThroughCache
+from app.helpers.dataloader import DataLoader
+from app.helpers.db import CONSISTENCY, DB_HELPER
+from app.helpers.exceptions import ValidationError
+from app.helpers.rabbitmq import broadcast_event
+from app.helpers.tracing import traced_class
+from app.settings import APP_SETTINGS
 
+USER_CACHE = ReadThroughCache(
+    backend=LRUTTLCache(
+        name="user",
+        max_entries=APP_SETTINGS.CACHE.USER_CACHE_MAX_ENTRIES,
+        ttl=APP_SETTINGS.CACHE.USER_CACHE_TTL_SECONDS,
+    )
+)
 
+
+def _requires_consistency() -> bool:
+    _ctx = CONSISTENCY.get()
+    return _ctx is not None and _ctx.required_lsn is not None
+
+
+@traced_class("service")
 class UserQueryService:
     @staticmethod
-    async def get_user(db: AsyncSession, user_uuid: uuid.UUID) -> User:
-        _user = await UserQueryHandler.get_user(db, user_uuid)
+    async def get_user(db: AsyncSession, user_uuid: uuid.UUID) -> UserRead | None:
+        _uuid = uuid.UUID(str(user_uuid))
+        if _requires_consistency():
+            # the cache, its in-flight loads and the loader's batches may all predate
+            # the client's own write, so a token-carrying read only trusts its session
+            return await UserQueryService._load_user(db, _uuid)
+        if APP_SETTINGS.QUERY.USER_LOADER_ENABLED:
+            _load = partial(USER_LOADER.load, _uuid)
+        else:
+            _load = partial(UserQueryService._load_user, db, _uuid)
+        if not APP_SETTINGS.CACHE.USER_CACHE_ENABLED:
+            return await _load()
+        _user = await USER_CACHE.get_or_load(_uuid, _load)
         return _user
+
+    @staticmethod
+    async def get_users(db: AsyncSession, user_uuids: list[uuid.UUID]) -> UserBatchRead:
+        _uuids = list(dict.fromkeys(user_uuids))
+        _load = partial(UserQueryService._load_users, db)
+        if APP_SETTINGS.CACHE.USER_CACHE_ENABLED and not _requires_consistency():
+            _users = await USER_CACHE.get_many_or_load(_uuids, _load)
+        else:
+            _users = await _load(_uuids)
+        return UserBatchRead(
+            users=[_users[u] for u in _uuids if _users.get(u) is not None],
+            missing=[u for u in _uuids if _users.get(u) is None],
+        )
+
+    @staticmethod
+    def _encode_cursor(user: UserRead) -> str:
+        return base64.urlsafe_b64encode(f"{user.created_at.isoformat()}|{user.uuid}".encode()).decode()
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> tuple[datetime.datetime, uuid.UUID]:
+        try:
+            _created_at, _uuid = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+            return datetime.datetime.fromisoformat(_created_at), uuid.UUID(_uuid)
+        except ValueError:
+            raise ValidationError(message="Invalid cursor")
+
+    @staticmethod
+    async def list_users(db: AsyncSession, limit: int, cursor: str | None = None) -> UserPage:
+        _after = UserQueryService._decode_cursor(cursor) if cursor else None
+        # one extra row tells whether there is a next page
+        _users = await UserQueryHandler.list_users(db, limit + 1, _after)
+        _page = [UserRead.model_validate(u) for u in _users[:limit]]
+        return UserPage(
+            users=_page,
+            next_cursor=UserQueryService._encode_cursor(_page[-1]) if len(_users) > limit else None,
+        )
+
+    @staticmethod
+    def _ndjson(users: list[User]) -> bytes:
+        return b"".join(pydantic_core.to_json(UserRead.model_validate(u)) + b"\n" for u in users)
+
+    @staticmethod
+    def _csv(users: list[User] | None = None) -> bytes:
+        _buffer = io.StringIO()
+        _writer = csv.writer(_buffer)
+        if users is None:
+            _writer.writerow(["uuid", "name", "email", "phone", "created_at"])
+        else:
+            _writer.writerows(
+                [u.uuid, u.name, u.email, u.phone, u.created_at.isoformat()] for u in users
+            )
+        return _buffer.getvalue().encode()
+
+    @staticmethod
+    async def export_users(fmt: Literal["ndjson", "csv"] = "ndjson") -> AsyncIterator[bytes]:
+        """Stream every user from a server-side cursor, one chunk per fetched batch.
+
+        The session is opened here rather than taken from a dependency, because
+        dependencies are torn down before a streaming response body is sent.
+        """
+        _batch_size = APP_SETTINGS.QUERY.USER_EXPORT_BATCH_SIZE
+        _encode = UserQueryService._csv if fmt == "csv" else UserQueryService._ndjson
+        if fmt == "csv":
+            yield UserQueryService._csv()
+        async with asynccontextmanager(DB_HELPER.session_dependency(db_name="replica"))() as db:
+            _users = await UserQueryHandler.stream_users(db, _batch_size)
+            async for _partition in _users.partitions(_batch_size):
+                yield _encode(_partition)
+
+    @staticmethod
+    async def _load_user(db: AsyncSession, user_uuid: uuid.UUID) -> UserRead | None:
+        _user = await UserQueryHandler.get_user(db, user_uuid)
+        return UserRead.model_validate(_user) if _user else None
+
+    @staticmethod
+    async def _load_users(db: AsyncSession, user_uuids: list[uuid.UUID]) -> dict[uuid.UUID, UserRead]:
+        _users = await UserQueryHandler.get_users(db, user_uuids)
+        return {u.uuid: UserRead.model_validate(u) for u in _users}
+
+    @staticmethod
+    async def _load_users_batch(user_uuids: list[uuid.UUID]) -> dict[uuid.UUID, UserRead]:
+        async with asynccontextmanager(DB_HELPER.session_dependency(db_name="replica"))() as db:
+            return await UserQueryService._load_users(db, user_uuids)
+
+
+USER_LOADER = DataLoader(
+    UserQueryService._load_users_batch,
+    max_batch_size=APP_SETTINGS.QUERY.USER_LOADER_MAX_BATCH_SIZE,
+)
+
+
+@broadcast_event.on('user_created', UserEvent)
+@broadcast_event.on('user_updated', UserEvent)
+async def _refresh_user_cache(db: AsyncSession, payload: UserEvent):
+    for _user_info in payload.users:
+        try:
+            _user = UserRead.model_validate(_user_info, from_attributes=True)
+        except ValueError:
+            # the event only carries part of the user, so drop the cached copy
+            USER_CACHE.invalidate(_user_info.uuid)
+            continue
+        USER_CACHE.set(_user.uuid, _user)
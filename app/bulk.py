@@ -0,0 +1,32 @@
+"""Bulk user import and export over COPY, for migrations and backfills.
+
+    python -m app.bulk import users.csv --chunk-size 10000
+    python -m app.bulk export users.csv
+"""
+import argparse
+import asyncio
+
+import uvloop
+
+from app.settings import APP_SETTINGS
+
+
+async def _main(args):
+    from app.api_v1.user_router.services.bulk import UserBulkService
+
+    if args.command == "import":
+        _result = await UserBulkService.import_users(args.path, args.chunk_size)
+        for _error in _result.pop("errors"):
+            print(f"Rejected {_error}")
+    else:
+        _result = await UserBulkService.export_users(args.path)
+    print(_result)
+
+
+if __name__ == "__main__":
+    _parser = argparse.ArgumentParser(description="Bulk user import and export")
+    _parser.add_argument("command", choices=["import", "export"])
+    _parser.add_argument("path")
+    _parser.add_argument("--chunk-size", type=int, default=APP_SETTINGS.DATABASE.BULK_COPY_CHUNK_SIZE)
+    uvloop.install()
+    asyncio.run(_main(_parser.parse_args()))
@@ -0,0 +1,160 @@
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+from app.helpers.metrics import CACHE_EVICTIONS, CACHE_HITS, CACHE_MISSES, CACHE_SIZE
+
+
+class CacheBackend(ABC):
+    @abstractmethod
+    def get(self, key: Hashable) -> Any:
+        """Return the cached value or ``None`` when absent or expired."""
+
+    @abstractmethod
+    def set(self, key: Hashable, value: Any):
+        ...
+
+    @abstractmethod
+    def delete(self, key: Hashable):
+        ...
+
+    @abstractmethod
+    def clear(self):
+        ...
+
+
+class LRUTTLCache(CacheBackend):
+    """In-process cache bounded by entry count, with a per-entry time to live."""
+
+    def __init__(self, name: str, max_entries: int = 10_000, ttl: float = 60):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._hits = CACHE_HITS.labels(cache=name)
+        self._misses = CACHE_MISSES.labels(cache=name)
+        self._evictions = CACHE_EVICTIONS.labels(cache=name)
+        CACHE_SIZE.labels(cache=name).set_function(lambda: len(self._entries))
+
+    def get(self, key: Hashable) -> Any:
+        _entry = self._entries.get(key)
+        if _entry is None or _entry[0] < time.monotonic():
+            if _entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            self._misses.inc()
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        self._hits.inc()
+        return _entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None):
+        """Store ``value``; ``ttl`` shortens its lifetime below the cache's own."""
+        _ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self._entries[key] = (time.monotonic() + _ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+            self._evictions.inc()
+
+    def delete(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class SingleFlight:
+    """Collapses concurrent calls for the same key into a single awaited call."""
+
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        _call = self._calls.get(key)
+        if _call is None:
+            _call = asyncio.ensure_future(func())
+            self._calls[key] = _call
+            _call.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(_call)
+
+
+class ReadThroughCache:
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self._flight = SingleFlight()
+        # [version, loads in flight] per key being loaded; the version is bumped by
+        # every write to the key, so a load that started before it is not cached
+        self._loading: dict[Hashable, list[int]] = {}
+
+    def _begin_load(self, key: Hashable) -> int:
+        _entry = self._loading.setdefault(key, [0, 0])
+        _entry[1] += 1
+        return _entry[0]
+
+    def _end_load(self, key: Hashable, version: int) -> bool:
+        """Whether the load of ``key`` begun at ``version`` may still be cached."""
+        _entry = self._loading[key]
+        _entry[1] -= 1
+        if not _entry[1]:
+            del self._loading[key]
+        return _entry[0] == version
+
+    def _bump(self, key: Hashable):
+        _entry = self._loading.get(key)
+        if _entry is not None:
+            _entry[0] += 1
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        _value = self.backend.get(key)
+        if _value is not None:
+            return _value
+        _version = self._begin_load(key)
+        try:
+            _value = await self._flight.do(key, loader)
+        finally:
+            _fresh = self._end_load(key, _version)
+        if _value is not None and _fresh:
+            self.backend.set(key, _value)
+        return _value
+
+    async def get_many_or_load(
+            self,
+            keys: list[Hashable],
+            loader: Callable[[list[Hashable]], Awaitable[dict[Hashable, Any]]],
+    ) -> dict[Hashable, Any]:
+        """Look ``keys`` up, loading every miss with one ``loader`` call."""
+        _values = {}
+        _missing = []
+        for _key in keys:
+            _value = self.backend.get(_key)
+            if _value is None:
+                _missing.append(_key)
+            else:
+                _values[_key] = _value
+        if _missing:
+            _versions = {_key: self._begin_load(_key) for _key in _missing}
+            try:
+                _loaded = await loader(_missing)
+            finally:
+                _fresh = {_key: self._end_load(_key, v) for _key, v in _versions.items()}
+            for _key, _value in _loaded.items():
+                if _value is not None and _fresh.get(_key):
+                    self.backend.set(_key, _value)
+            _values.update(_loaded)
+        return _values
+
+    def set(self, key: Hashable, value: Any):
+        self._bump(key)
+        self.backend.set(key, value)
+
+    def invalidate(self, key: Hashable):
+        self._bump(key)
+        self.backend.delete(key)
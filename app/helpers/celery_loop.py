@@ -0,0 +1,176 @@
+"""One long-lived event loop per Celery worker process.
+
+The loop runs forever on a background thread, started at ``worker_process_init``
+together with the replica health checks and a few warm pooled connections per
+engine. Task bodies are submitted to it, so engines, pools and other clients
+bound to the loop are reused from task to task. The solo pool never sends
+``worker_process_init``; there the loop starts with the first task.
+
+    @async_task(name="send_digest")
+    async def send_digest(user_id: str):
+        ...
+
+    @batch_task(name="touch_users")
+    async def touch_users(db: AsyncSession, user_ids: list[str]):
+        ...
+
+    touch_users.delay_many(user_ids)  # one message and one transaction per chunk
+"""
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from functools import wraps
+from typing import Any, Awaitable, Callable, Iterable
+
+import uvloop
+from celery.signals import worker_process_init, worker_process_shutdown
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.helpers.celery_app import celery_app
+from app.helpers.db import DB_HELPER
+from app.settings import APP_SETTINGS
+
+
+class WorkerLoop:
+    def __init__(self, warm_connections: int = APP_SETTINGS.CELERY.CELERY_DB_WARM_CONNECTIONS):
+        self.warm_connections = warm_connections
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self.loop is not None:
+                return
+            self.loop = uvloop.new_event_loop()
+            self._thread = threading.Thread(
+                target=self.loop.run_forever, name="celery-event-loop", daemon=True
+            )
+            self._thread.start()
+        try:
+            self.run(self._warm())
+        except Exception as e:
+            # the pools fill on demand anyway; a failed warm-up must not kill the worker
+            print(f"Warming the worker's engines failed: {e}")
+
+    async def _warm(self):
+        DB_HELPER.replicas.start()
+        await DB_HELPER.warm(self.warm_connections)
+
+    def run(self, coro: Awaitable, timeout: float | None = None) -> Any:
+        """Run ``coro`` on the worker's loop and wait for its result.
+
+        The coroutine is cancelled if the wait times out or is interrupted, e.g. by
+        Celery's soft time limit, instead of being left running on the loop.
+        """
+        if self.loop is None:
+            self.start()
+        _future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return _future.result(timeout)
+        except BaseException:
+            _future.cancel()
+            raise
+
+    async def _close(self):
+        await DB_HELPER.replicas.stop()
+        await DB_HELPER.dispose()
+
+    def stop(self):
+        if self.loop is None:
+            return
+        try:
+            self.run(self._close(), timeout=10)
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join()
+            self.loop.close()
+            self.loop = self._thread = None
+
+
+WORKER_LOOP = WorkerLoop()
+
+
+@worker_process_init.connect
+def _start_worker_loop(**_):
+    DB_HELPER.after_fork()
+    WORKER_LOOP.start()
+
+
+@worker_process_shutdown.connect
+def _stop_worker_loop(**_):
+    WORKER_LOOP.stop()
+
+
+def _time_limit() -> float | None:
+    """The tighter of the running task's soft and hard time limits, if it has any."""
+    _task = celery_app.current_task
+    if _task is None:
+        return None
+    _hard, _soft = _task.request.timelimit or (None, None)
+    _limits = [
+        _hard or _task.time_limit or celery_app.conf.task_time_limit,
+        _soft or _task.soft_time_limit or celery_app.conf.task_soft_time_limit,
+    ]
+    return min((_limit for _limit in _limits if _limit), default=None)
+
+
+def async_task(*args, **options):
+    """``celery_app.task`` for ``async def`` bodies, run on the worker's loop."""
+
+    def decorator(func: Callable[..., Awaitable]):
+        @wraps(func)
+        def _run(*a, **kw):
+            return WORKER_LOOP.run(func(*a, **kw), timeout=_time_limit())
+
+        return celery_app.task(*args, **options)(_run)
+
+    return decorator
+
+
+class BatchTask:
+    """A task whose messages carry a chunk of items handled in one transaction."""
+
+    def __init__(self, task, chunk_size: int):
+        self.task = task
+        self.chunk_size = chunk_size
+
+    def delay(self, item: Any):
+        return self.task.delay([item])
+
+    def delay_many(self, items: Iterable[Any], chunk_size: int | None = None) -> list:
+        _chunk_size = chunk_size or self.chunk_size
+        _items = list(items)
+        return [
+            self.task.delay(_items[i:i + _chunk_size])
+            for i in range(0, len(_items), _chunk_size)
+        ]
+
+
+def batch_task(
+        name: str,
+        chunk_size: int = APP_SETTINGS.CELERY.CELERY_BATCH_CHUNK_SIZE,
+        **options,
+):
+    """Turn ``async def handler(db, items)`` into a ``BatchTask``.
+
+    Items are sent ``chunk_size`` to a message. The handler gets the whole chunk
+    with one primary session, and the chunk is committed once, so the items of a
+    chunk share their round trips instead of paying one task and one
+    transaction each.
+    """
+
+    def decorator(handler: Callable[[AsyncSession, list], Awaitable[Any]]) -> BatchTask:
+        async def _handle(items: list):
+            async with asynccontextmanager(DB_HELPER.session_dependency(db_name="primary"))() as db:
+                _result = await handler(db, items)
+                await db.commit()
+            return _result
+
+        @wraps(handler)
+        def _run(items: list):
+            return WORKER_LOOP.run(_handle(items), timeout=_time_limit())
+
+        return BatchTask(celery_app.task(name=name, **options)(_run), chunk_size)
+
+    return decorator
@@ -0,0 +1,118 @@
+import json
+from abc import ABC, abstractmethod
+from typing import Any
+
+import pydantic_core
+from pydantic import BaseModel
+
+from app.settings import APP_SETTINGS
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_CONTENT_TYPE = "application/json"
+MSGPACK_CONTENT_TYPE = "application/msgpack"
+
+
+class Codec(ABC):
+    name: str
+    content_type: str
+
+    @abstractmethod
+    def encode(self, obj: Any) -> bytes:
+        ...
+
+    @abstractmethod
+    def decode(self, body: bytes) -> Any:
+        ...
+
+
+class JsonCodec(Codec):
+    name = "json"
+    content_type = JSON_CONTENT_TYPE
+
+    def encode(self, obj: Any) -> bytes:
+        if isinstance(obj, BaseModel):
+            return pydantic_core.to_json(obj)
+        return json.dumps(obj, default=pydantic_core.to_jsonable_python).encode()
+
+    def decode(self, body: bytes) -> Any:
+        return json.loads(body)
+
+
+class OrjsonCodec(Codec):
+    name = "orjson"
+    content_type = JSON_CONTENT_TYPE
+
+    def encode(self, obj: Any) -> bytes:
+        if isinstance(obj, BaseModel):
+            return pydantic_core.to_json(obj)
+        return orjson.dumps(obj, default=pydantic_core.to_jsonable_python)
+
+    def decode(self, body: bytes) -> Any:
+        return orjson.loads(body)
+
+
+class MsgpackCodec(Codec):
+    name = "msgpack"
+    content_type = MSGPACK_CONTENT_TYPE
+
+    def encode(self, obj: Any) -> bytes:
+        # msgpack has no hook for pydantic types, so models go through their
+        # jsonable form; plain containers only fall back for values it can't pack
+        if isinstance(obj, BaseModel):
+            obj = pydantic_core.to_jsonable_python(obj)
+        return msgpack.packb(obj, default=pydantic_core.to_jsonable_python)
+
+    def decode(self, body: bytes) -> Any:
+        return msgpack.unpackb(body)
+
+
+CODECS: dict[str, Codec] = {"json": JsonCodec()}
+if orjson is not None:
+    CODECS["orjson"] = OrjsonCodec()
+if msgpack is not None:
+    CODECS["msgpack"] = MsgpackCodec()
+
+# incoming messages are decoded by content type, whichever codec encoded them;
+# messages without one predate codecs and are JSON
+_DECODERS: dict[str | None, Codec] = {
+    None: CODECS.get("orjson", CODECS["json"]),
+    JSON_CONTENT_TYPE: CODECS.get("orjson", CODECS["json"]),
+}
+if msgpack is not None:
+    _DECODERS[MSGPACK_CONTENT_TYPE] = CODECS["msgpack"]
+    _DECODERS["application/x-msgpack"] = CODECS["msgpack"]
+
+_EXCHANGE_CODECS: dict[str, Codec] = {}
+
+
+def get_codec(name: str) -> Codec:
+    _codec = CODECS.get(name)
+    if _codec is None:
+        print(f"Codec {name} is not available, falling back to json")
+        _codec = CODECS["json"]
+    return _codec
+
+
+def codec_for_exchange(exchange: str) -> Codec:
+    _codec = _EXCHANGE_CODECS.get(exchange)
+    if _codec is None:
+        _codec = _EXCHANGE_CODECS[exchange] = get_codec(
+            APP_SETTINGS.RABBITMQ.EXCHANGE_CODECS.get(exchange, APP_SETTINGS.RABBITMQ.CODEC)
+        )
+    return _codec
+
+
+def decode(body: bytes, content_type: str | None = None) -> Any:
+    _codec = _DECODERS.get(content_type or None)
+    if _codec is None:
+        raise ValueError(f"Unsupported content type {content_type}")
+    return _codec.decode(body)
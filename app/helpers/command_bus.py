@@ -0,0 +1,115 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+
+BatchHandler = Callable[[list[Any]], Awaitable[list[Any]]]
+
+
+class CommandBus:
+    """Coalesces concurrently dispatched commands into batches.
+
+    Commands arriving within ``max_wait_ms`` of the first queued one (or until
+    ``max_batch_size`` is reached) are handed to ``handler`` together. The handler
+    returns one result per command, in order; a result that is an exception is
+    raised to that command's caller only.
+    """
+
+    def __init__(
+            self,
+            handler: BatchHandler,
+            max_batch_size: int = 100,
+            max_wait_ms: float = 5,
+            max_concurrent_batches: int = 2,
+    ):
+        self._handler = handler
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait_ms / 1000
+        self._max_concurrent_batches = max_concurrent_batches
+        self._queue: asyncio.Queue | None = None
+        self._batch_full: asyncio.Event | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._collector: asyncio.Task | None = None
+        self._flushes: set[asyncio.Task] = set()
+
+    def _start(self):
+        self._queue = asyncio.Queue()
+        self._batch_full = asyncio.Event()
+        self._slots = asyncio.Semaphore(self._max_concurrent_batches)
+        self._collector = asyncio.create_task(self._collect())
+
+    async def dispatch(self, command: Any) -> Any:
+        if self._collector is None or self._collector.done():
+            self._start()
+        _future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((command, _future))
+        if self._queue.qsize() >= self._max_batch_size:
+            self._batch_full.set()
+        return await _future
+
+    async def _collect(self):
+        _batch = []
+        try:
+            while True:
+                _batch = [await self._queue.get()]
+                if self._queue.qsize() + 1 < self._max_batch_size:
+                    try:
+                        await asyncio.wait_for(self._batch_full.wait(), self._max_wait)
+                    except asyncio.TimeoutError:
+                        pass
+                self._batch_full.clear()
+                while len(_batch) < self._max_batch_size and not self._queue.empty():
+                    _batch.append(self._queue.get_nowait())
+                if self._queue.qsize() >= self._max_batch_size:
+                    self._batch_full.set()
+
+                await self._slots.acquire()
+                _flush = asyncio.create_task(self._flush(_batch))
+                self._flushes.add(_flush)
+                _flush.add_done_callback(self._flushes.discard)
+                _batch = []
+        except asyncio.CancelledError:
+            for _, _future in _batch:
+                _future.cancel()
+            raise
+
+    async def _flush(self, batch: list[tuple[Any, asyncio.Future]]):
+        try:
+            _results = await self._handler([command for command, _ in batch])
+        except Exception as e:
+            _results = [e] * len(batch)
+        except BaseException as e:
+            # e.g. cancelled at shutdown: fail the callers rather than leave them waiting
+            for _, _future in batch:
+                if not _future.done():
+                    _future.set_exception(e)
+            raise
+        finally:
+            self._slots.release()
+        if len(_results) != len(batch):
+            # a missing result would leave its caller waiting forever
+            _error = RuntimeError(
+                f"Batch handler returned {len(_results)} results for {len(batch)} commands"
+            )
+            _results = [_error] * len(batch)
+        for (_, _future), _result in zip(batch, _results):
+            if _future.done():
+                continue
+            if isinstance(_result, BaseException):
+                _future.set_exception(_result)
+            else:
+                _future.set_result(_result)
+
+    async def close(self):
+        if self._collector is None:
+            return
+        self._collector.cancel()
+        try:
+            await self._collector
+        except asyncio.CancelledError:
+            pass
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+        while not self._queue.empty():
+            _, _future = self._queue.get_nowait()
+            if not _future.done():
+                _future.cancel()
+        self._collector = None
@@ -0,0 +1,152 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Callable
+
+from aio_pika import ExchangeType
+from aio_pika.abc import AbstractChannel, AbstractConnection, AbstractIncomingMessage
+
+from app.helpers.codecs import decode
+from app.settings import APP_SETTINGS
+
+
+class AckTracker:
+    """Acknowledges messages in delivery-tag order with as few acks as possible.
+
+    Successfully handled messages are acked together, with ``multiple=True``, up to
+    the highest tag below which every delivery is settled. Failed messages are
+    rejected on their own right away.
+    """
+
+    def __init__(self):
+        self._pending: dict[int, AbstractIncomingMessage] = {}
+        # settled tags still waiting for lower tags, and whether they succeeded
+        self._settled: dict[int, bool] = {}
+
+    def track(self, message: AbstractIncomingMessage):
+        self._pending[message.delivery_tag] = message
+
+    async def settle(self, *messages: AbstractIncomingMessage, ok: bool = True):
+        for _message in messages:
+            if not ok:
+                await _message.reject(requeue=False)
+            self._settled[_message.delivery_tag] = ok
+        _last_ok = None
+        for _tag in sorted(self._pending):
+            if _tag not in self._settled:
+                break
+            _message = self._pending.pop(_tag)
+            if self._settled.pop(_tag):
+                _last_ok = _message
+        if _last_ok is not None:
+            # rejected tags below are no longer outstanding, so this acks only successes
+            await _last_ok.ack(multiple=True)
+
+
+class ConsumerEngine:
+    """Consumes a queue with a prefetch limit and a bounded pool of workers.
+
+    With ``batch_size`` > 1, up to ``batch_size`` messages (or whatever arrived
+    within ``batch_wait_ms``) are handled together in one session and transaction.
+    Handlers registered with ``on_batch`` receive every event of their name as a
+    list. If a batch fails, its messages are retried one by one so that only the
+    offending ones are rejected.
+    """
+
+    def __init__(
+            self,
+            connection: Callable[[], AbstractConnection],
+            queue_name: str,
+            register,
+            session_maker,
+            prefetch: int = APP_SETTINGS.RABBITMQ.CONSUMER_PREFETCH,
+            concurrency: int = APP_SETTINGS.RABBITMQ.CONSUMER_CONCURRENCY,
+            batch_size: int = APP_SETTINGS.RABBITMQ.CONSUMER_BATCH_SIZE,
+            batch_wait_ms: float = APP_SETTINGS.RABBITMQ.CONSUMER_BATCH_WAIT_MS,
+            routing_keys: list[str] | None = None,
+    ):
+        self._connection = connection
+        self.queue_name = queue_name
+        self.register = register
+        self.session_maker = session_maker
+        self.prefetch = prefetch
+        self.concurrency = concurrency
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait_ms / 1000
+        # bind the queue to the exchange with these keys, e.g. for a worker shard
+        self.routing_keys = routing_keys or []
+        self._channel: AbstractChannel | None = None
+        self._messages: asyncio.Queue[AbstractIncomingMessage] = asyncio.Queue()
+        self._acks = AckTracker()
+        self._workers: list[asyncio.Task] = []
+
+    async def start(self):
+        self._channel = await self._connection().channel()
+        await self._channel.set_qos(prefetch_count=self.prefetch)
+        _queue = await self._channel.declare_queue(self.queue_name, durable=True)
+        if self.routing_keys:
+            _exchange = await self._channel.declare_exchange(
+                APP_SETTINGS.RABBITMQ.EXCHANGE, ExchangeType.TOPIC, durable=True
+            )
+            for _routing_key in self.routing_keys:
+                await _queue.bind(_exchange, _routing_key)
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+        await _queue.consume(self._on_message)
+
+    async def stop(self):
+        for _worker in self._workers:
+            _worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self._channel is not None and not self._channel.is_closed:
+            await self._channel.close()
+
+    async def _on_message(self, message: AbstractIncomingMessage):
+        self._acks.track(message)
+        self._messages.put_nowait(message)
+
+    async def _next_batch(self) -> list[AbstractIncomingMessage]:
+        _batch = [await self._messages.get()]
+        if self.batch_size == 1:
+            return _batch
+        _deadline = asyncio.get_running_loop().time() + self.batch_wait
+        while len(_batch) < self.batch_size:
+            if not self._messages.empty():
+                _batch.append(self._messages.get_nowait())
+                continue
+            _timeout = _deadline - asyncio.get_running_loop().time()
+            if _timeout <= 0:
+                break
+            try:
+                _batch.append(await asyncio.wait_for(self._messages.get(), _timeout))
+            except asyncio.TimeoutError:
+                break
+        return _batch
+
+    async def _work(self):
+        while True:
+            _batch = await self._next_batch()
+            if len(_batch) > 1:
+                try:
+                    await self._handle([self._decode(m) for m in _batch])
+                except Exception as e:
+                    print(f"Batch of {len(_batch)} failed, retrying one by one: {e}")
+                else:
+                    await self._acks.settle(*_batch)
+                    continue
+            for _message in _batch:
+                try:
+                    await self._handle([self._decode(_message)])
+                except Exception as e:
+                    print(e)
+                    await self._acks.settle(_message, ok=False)
+                else:
+                    await self._acks.settle(_message)
+
+    @staticmethod
+    def _decode(message: AbstractIncomingMessage) -> dict:
+        return decode(message.body, message.content_type)
+
+    async def _handle(self, payloads: list[dict]):
+        async with asynccontextmanager(self.session_maker)() as db:
+            await self.register.dispatch(db, payloads)
+            await db.commit()
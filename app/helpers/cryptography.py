@@ -1,3 +1,8 @@
+import asyncio
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from functools import wraps
 
@@ -5,11 +10,18 @@ import bcrypt
 import jwt
 from jwt import ExpiredSignatureError, InvalidTokenError, PyJWTError
 
+from app.helpers.cache import LRUTTLCache
 from app.helpers.exceptions import (
     AuthenticationFailedError,
     JWTExpiredSignatureError,
     JWTInvalidTokenError,
     JWTTokenError,
+    ServiceUnavailableException,
+)
+from app.helpers.metrics import (
+    PASSWORD_HASH_PENDING,
+    PASSWORD_HASH_REJECTED,
+    PASSWORD_HASH_SECONDS,
 )
 from app.settings import APP_SETTINGS
 
@@ -17,6 +29,10 @@ JWT_SECRET = APP_SETTINGS.JWT.JWT_ACCESS_SECRET
 ALGORITHM = APP_SETTINGS.JWT.JWT_ALGORITHM
 ACCESS_TOKEN_EXPIRE_MINUTES = REFRESH_TOKEN_EXPIRE_DAYS = APP_SETTINGS.JWT.VERIFICATION_MINUTES
 AES_KEY = APP_SETTINGS.WIDGET.ENCRYPTION_KEY
+PASSWORD_HASH_ROUNDS = APP_SETTINGS.JWT.PASSWORD_HASH_ROUNDS
+
+_HASH_SECONDS = PASSWORD_HASH_SECONDS.labels(operation="hash")
+_VALIDATE_SECONDS = PASSWORD_HASH_SECONDS.labels(operation="validate")
 
 
 def jwt_exception_handler(func):
@@ -61,19 +77,156 @@ def jwt_encode(data: dict):
     return jwt.encode(data, JWT_SECRET, algorithm=ALGORITHM)
 
 
+def token_digest(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+
+class VerifiedTokenCache:
+    """Claims of tokens that already passed ``jwt_decode``, keyed by token digest.
+
+    An entry lives until the token's ``exp`` (and at most ``ttl``), so an expired
+    token is always decoded again and rejected. Revoked digests are remembered
+    until the token would have expired and are refused even when cached.
+    """
+
+    def __init__(
+            self,
+            max_entries: int = APP_SETTINGS.JWT.JWT_CACHE_MAX_ENTRIES,
+            ttl: float = APP_SETTINGS.JWT.JWT_CACHE_TTL_SECONDS,
+            revoked_max_entries: int = APP_SETTINGS.JWT.JWT_REVOKED_MAX_ENTRIES,
+    ):
+        self.claims = LRUTTLCache(name="jwt", max_entries=max_entries, ttl=ttl)
+        # refresh tokens are the longest lived, so revocations are kept that long
+        self.revoked = LRUTTLCache(
+            name="jwt_revoked",
+            max_entries=revoked_max_entries,
+            ttl=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS).total_seconds(),
+        )
+
+    def decode(self, token: str) -> dict:
+        _digest = token_digest(token)
+        if self.revoked.get(_digest) is not None:
+            raise JWTInvalidTokenError
+        _claims = self.claims.get(_digest)
+        if _claims is None:
+            _claims = jwt_decode(token)
+            _exp = _claims.get("exp")
+            _ttl = None if _exp is None else _exp - time.time()
+            if _ttl is None or _ttl > 0:
+                self.claims.set(_digest, _claims, ttl=_ttl)
+        return dict(_claims)
+
+    def revoke_digest(self, digest: bytes, expires_at: float | None = None):
+        self.claims.delete(digest)
+        self.revoked.set(digest, True, ttl=None if expires_at is None else expires_at - time.time())
+
+    def revoke(self, token: str):
+        try:
+            _exp = jwt.decode(token, options={"verify_signature": False}).get("exp")
+        except PyJWTError:
+            _exp = None
+        self.revoke_digest(token_digest(token), _exp)
+
+    def clear(self):
+        self.claims.clear()
+
+
+TOKEN_CACHE = VerifiedTokenCache()
+
+
+def jwt_decode_cached(token: str) -> dict:
+    """``jwt_decode`` that reuses the claims of tokens verified before."""
+    if not APP_SETTINGS.JWT.JWT_CACHE_ENABLED:
+        return jwt_decode(token)
+    return TOKEN_CACHE.decode(token)
+
+
 def hash_password(
         password: str,
 ) -> bytes:
-    salt = bcrypt.gensalt()
+    _started = time.perf_counter()
+    salt = bcrypt.gensalt(rounds=PASSWORD_HASH_ROUNDS)
     pwd_bytes: bytes = password.encode()
-    return bcrypt.hashpw(pwd_bytes, salt)
+    hashed = bcrypt.hashpw(pwd_bytes, salt)
+    _HASH_SECONDS.observe(time.perf_counter() - _started)
+    return hashed
 
 
 def validate_password(
         password: str,
         hashed_password: bytes,
 ) -> bool:
-    return bcrypt.checkpw(
+    _started = time.perf_counter()
+    valid = bcrypt.checkpw(
         password=password.encode(),
         hashed_password=hashed_password,
     )
+    _VALIDATE_SECONDS.observe(time.perf_counter() - _started)
+    return valid
+
+
+class PasswordHasher:
+    """Runs bcrypt on a small thread pool instead of the event loop.
+
+    bcrypt releases the GIL while hashing, so threads are enough to hash in
+    parallel. Calls beyond ``max_pending`` queued or running hashes are refused
+    with ``ServiceUnavailableException`` rather than piling up behind a login burst.
+    """
+
+    def __init__(
+            self,
+            workers: int = APP_SETTINGS.JWT.PASSWORD_HASH_WORKERS,
+            max_pending: int = APP_SETTINGS.JWT.PASSWORD_HASH_MAX_PENDING,
+    ):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        # released from the pool's threads, when a job ends rather than when its caller does
+        self._pending_lock = threading.Lock()
+        # created on first use, so that forked workers start their own threads
+        self._executor: ThreadPoolExecutor | None = None
+
+    def _release(self, _job=None):
+        with self._pending_lock:
+            self.pending -= 1
+        PASSWORD_HASH_PENDING.dec()
+
+    async def _run(self, func, *args):
+        with self._pending_lock:
+            if self.pending >= self.max_pending:
+                PASSWORD_HASH_REJECTED.inc()
+                raise ServiceUnavailableException(message="Too many password checks in progress, retry shortly")
+            self.pending += 1
+        PASSWORD_HASH_PENDING.inc()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        try:
+            _job = self._executor.submit(func, *args)
+        except BaseException:
+            self._release()
+            raise
+        # a cancelled caller cancels the job only if it has not started yet
+        _job.add_done_callback(self._release)
+        return await asyncio.wrap_future(_job)
+
+    async def hash(self, password: str) -> bytes:
+        return await self._run(hash_password, password)
+
+    async def validate(self, password: str, hashed_password: bytes) -> bool:
+        return await self._run(validate_password, password, hashed_password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+PASSWORD_HASHER = PasswordHasher()
+
+
+async def hash_password_async(password: str) -> bytes:
+    return await PASSWORD_HASHER.hash(password)
+
+
+async def validate_password_async(password: str, hashed_password: bytes) -> bool:
+    return await PASSWORD_HASHER.validate(password, hashed_password)
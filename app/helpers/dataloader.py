@@ -0,0 +1,54 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+BatchLoader = Callable[[list[Hashable]], Awaitable[dict[Hashable, Any]]]
+
+
+class DataLoader:
+    """Coalesces ``load`` calls made in the same event-loop tick into one batch.
+
+    The first ``load`` of a tick schedules a dispatch with ``call_soon``, so every
+    lookup started before the loop gets back to it joins the same batch. Keys are
+    de-duplicated and handed to ``batch_load`` in chunks of ``max_batch_size``;
+    it returns a dict, and keys missing from it resolve to ``None``.
+    """
+
+    def __init__(self, batch_load: BatchLoader, max_batch_size: int = 100):
+        self._batch_load = batch_load
+        self._max_batch_size = max_batch_size
+        self._pending: dict[Hashable, list[asyncio.Future]] = {}
+        self._scheduled = False
+        self._batches: set[asyncio.Task] = set()
+
+    async def load(self, key: Hashable) -> Any:
+        _loop = asyncio.get_running_loop()
+        _future = _loop.create_future()
+        self._pending.setdefault(key, []).append(_future)
+        if not self._scheduled:
+            self._scheduled = True
+            _loop.call_soon(self._dispatch)
+        return await _future
+
+    def _dispatch(self):
+        self._scheduled = False
+        _pending, self._pending = self._pending, {}
+        _keys = list(_pending)
+        for i in range(0, len(_keys), self._max_batch_size):
+            _batch = {k: _pending[k] for k in _keys[i:i + self._max_batch_size]}
+            _task = asyncio.create_task(self._load_batch(_batch))
+            self._batches.add(_task)
+            _task.add_done_callback(self._batches.discard)
+
+    async def _load_batch(self, batch: dict[Hashable, list[asyncio.Future]]):
+        try:
+            _results = await self._batch_load(list(batch))
+        except Exception as e:
+            for _futures in batch.values():
+                for _future in _futures:
+                    if not _future.done():
+                        _future.set_exception(e)
+            return
+        for _key, _futures in batch.items():
+            for _future in _futures:
+                if not _future.done():
+                    _future.set_result(_results.get(_key))
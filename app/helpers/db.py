@@ -1,10 +1,15 @@
+import asyncio
 import datetime
 import re
+import time
 import uuid
 from asyncio import current_task
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
 
 import sqlalchemy
-from sqlalchemy import func
+from sqlalchemy import event, func, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.ext.asyncio import (
     AsyncSession,
@@ -12,8 +17,26 @@ from sqlalchemy.ext.asyncio import (
     async_sessionmaker,
     create_async_engine,
 )
-from sqlalchemy.orm import DeclarativeBase, Mapped, declared_attr, mapped_column
+from sqlalchemy.orm import (
+    DeclarativeBase,
+    Mapped,
+    Session,
+    declared_attr,
+    mapped_column,
+)
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
+from app.helpers.metrics import (
+    DB_POOL_ACQUIRE_SECONDS,
+    DB_POOL_CHECKED_OUT,
+    DB_POOL_OVERFLOW,
+    DB_POOL_SIZE,
+    DB_POOL_WAITERS,
+    DB_READ_ROUTING,
+    DB_READ_WAIT_SECONDS,
+)
+from app.helpers.replicas import BALANCERS, ReplicaPool, lsn_to_int
+from app.helpers.tracing import span
 from app.settings import APP_SETTINGS
 
 
@@ -24,54 +47,243 @@ def to_snake_case(name):
     return name.lower()
 
 
+@dataclass
+class ConsistencyContext:
+    # WAL position the client has already observed and expects reads to include
+    required_lsn: int | None = None
+    # WAL position after this request's writes, handed back to the client
+    commit_lsn: str | None = None
+    wrote: bool = False
+
+
+CONSISTENCY: ContextVar[ConsistencyContext | None] = ContextVar("consistency", default=None)
+
+
+@event.listens_for(Session, "after_commit")
+def _mark_committed(session):
+    session.info["committed"] = True
+
+
+def parse_replica_urls(urls: str) -> dict[str, str]:
+    """Parse ``name=url,url,...`` into named replica urls; unnamed ones get ``replica-<n>``."""
+    _replicas = {}
+    for i, _entry in enumerate(filter(None, (u.strip() for u in urls.split(","))), start=1):
+        _name, _sep, _url = _entry.partition("=")
+        if not _sep or "://" in _name:
+            _name, _url = f"replica-{i}", _entry
+        _replicas[_name] = _url
+    return _replicas
+
+
+class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that reports how long and how many callers wait for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        _name = self._orig_logging_name or "default"
+        self._waiters = DB_POOL_WAITERS.labels(engine=_name)
+        self._acquire_seconds = DB_POOL_ACQUIRE_SECONDS.labels(engine=_name)
+
+    def connect(self):
+        _started = time.perf_counter()
+        self._waiters.inc()
+        try:
+            with span("session", "acquire"):
+                return super().connect()
+        finally:
+            self._waiters.dec()
+            self._acquire_seconds.observe(time.perf_counter() - _started)
+
+
 class DbHelper:
-    _ENGINES = {}
+    """Engines for the primary and every named replica.
+
+    ``'replica'`` is not an engine of its own: sessions asked for it are bound to
+    one of the healthy replicas chosen by the replica pool.
+    """
 
-    def __init__(self, urls: [str], echo: bool = False):
+    def __init__(self, urls: [str], echo: bool = False, replica_names: [str] = None):
+        self._ENGINES = {}
+        _replicas = {}
+        _replica_names = list(replica_names or [])
+        self._SESSION_FACTORIES = {}
+        self._SCOPED_SESSIONS = {}
         for i, url in enumerate(urls):
-            _engine = create_async_engine(
-                url=url, echo=echo, pool_size=5, max_overflow=10, future=True
-            )
             if i == 0:
-                self._ENGINES.update({'primary': _engine})
+                _name = 'primary'
             else:
-                self._ENGINES.update({'replica': _engine})
+                _name = _replica_names[i - 1] if i <= len(_replica_names) else f"replica-{i}"
+            _engine = self._create_engine(_name, url, echo)
+            self._ENGINES.update({_name: _engine})
+            self._SESSION_FACTORIES[_name] = async_sessionmaker(
+                bind=_engine,
+                autoflush=False,
+                autocommit=False,
+                expire_on_commit=False,
+            )
+            self._SCOPED_SESSIONS[_name] = async_scoped_session(
+                session_factory=self._SESSION_FACTORIES[_name],
+                scopefunc=current_task,
+            )
+            if i > 0:
+                _replicas[_name] = _engine
+        self.replicas = ReplicaPool(
+            replicas=_replicas,
+            primary=self._ENGINES['primary'],
+            balancer=BALANCERS[APP_SETTINGS.DATABASE.REPLICA_BALANCER](),
+            check_interval=APP_SETTINGS.DATABASE.REPLICA_HEALTH_CHECK_INTERVAL_SECONDS,
+            max_lag_bytes=APP_SETTINGS.DATABASE.REPLICA_MAX_LAG_BYTES,
+            failure_threshold=APP_SETTINGS.DATABASE.REPLICA_FAILURE_THRESHOLD,
+        )
+
+    @staticmethod
+    def _create_engine(name: str, url: str, echo: bool = False):
+        _pool = {
+            "pool_size": APP_SETTINGS.DATABASE.POOL_SIZE,
+            "max_overflow": APP_SETTINGS.DATABASE.MAX_OVERFLOW,
+            "pool_timeout": APP_SETTINGS.DATABASE.POOL_TIMEOUT,
+            **APP_SETTINGS.DATABASE.POOL_OVERRIDES.get(name, {}),
+        }
+        _engine = create_async_engine(
+            url=url,
+            echo=echo,
+            future=True,
+            poolclass=InstrumentedAsyncQueuePool,
+            pool_logging_name=name,
+            **_pool,
+        )
+        _sync_engine = _engine.sync_engine
+        DB_POOL_SIZE.labels(engine=name).set(_pool["pool_size"])
+        DB_POOL_CHECKED_OUT.labels(engine=name).set_function(
+            lambda: _sync_engine.pool.checkedout()
+        )
+        DB_POOL_OVERFLOW.labels(engine=name).set_function(
+            lambda: max(0, _sync_engine.pool.overflow())
+        )
+        return _engine
+
+    def after_fork(self):
+        """Drop pooled connections inherited from the parent process without closing them."""
+        for _engine in self._ENGINES.values():
+            _engine.sync_engine.dispose(close=False)
+
+    async def warm(self, connections: int = 1):
+        """Open ``connections`` pooled connections per engine ahead of the first query."""
+
+        async def _open(engine):
+            async with engine.connect() as _connection:
+                await _connection.execute(text("SELECT 1"))
+
+        await asyncio.gather(
+            *(_open(_engine) for _engine in self._ENGINES.values() for _ in range(connections))
+        )
+
+    async def dispose(self):
+        await asyncio.gather(*(_engine.dispose() for _engine in self._ENGINES.values()))
+
+    def mark_write(self):
+        """Flag the current request as having written to the primary outside its own session."""
+        _ctx = CONSISTENCY.get()
+        if _ctx is not None:
+            _ctx.wrote = True
+
+    async def _record_commit_lsn(self, session: AsyncSession):
+        _ctx = CONSISTENCY.get()
+        if _ctx is None or session.bind.dialect.name != "postgresql":
+            return
+        if not (_ctx.wrote or session.info.get("committed")):
+            return
+        _lsn = await session.scalar(text("SELECT pg_current_wal_lsn()"))
+        _ctx.commit_lsn = str(_lsn)
+        self.replicas.observe_primary_lsn(lsn_to_int(_ctx.commit_lsn))
+
+    async def resolve_read_db(self, db_name: str = 'replica') -> str:
+        """Resolve ``'replica'`` to a healthy replica that has replayed the client's last write.
+
+        Waits up to ``READ_YOUR_WRITES_MAX_WAIT_MS`` for some replica to catch up,
+        then falls back to the primary. The primary also serves reads when every
+        replica is ejected.
+        """
+        if db_name != 'replica':
+            return db_name
+        _ctx = CONSISTENCY.get()
+        _required = _ctx.required_lsn if _ctx is not None else None
+        if _required is None:
+            _replica = self.replicas.choose()
+            if _replica is None:
+                DB_READ_ROUTING.labels(target='primary', reason="no_healthy_replica").inc()
+                return 'primary'
+            return _replica.name
+
+        self.replicas.observe_primary_lsn(_required)
+        _poll_interval = APP_SETTINGS.DATABASE.REPLICA_LSN_POLL_INTERVAL_MS / 1000
+        _replica = self.replicas.choose(min_lsn=_required)
+        if _replica is not None:
+            DB_READ_ROUTING.labels(target=_replica.name, reason="up_to_date").inc()
+            return _replica.name
+        if not any(r.is_postgres for r in self.replicas.healthy()):
+            DB_READ_ROUTING.labels(target='primary', reason="no_healthy_replica").inc()
+            return 'primary'
+
+        _started = time.monotonic()
+        _deadline = _started + APP_SETTINGS.DATABASE.READ_YOUR_WRITES_MAX_WAIT_MS / 1000
+        while True:
+            await self.replicas.refresh_replay_lsns(max_age=_poll_interval)
+            _replica = self.replicas.choose(min_lsn=_required)
+            if _replica is not None:
+                DB_READ_WAIT_SECONDS.observe(time.monotonic() - _started)
+                DB_READ_ROUTING.labels(target=_replica.name, reason="caught_up").inc()
+                return _replica.name
+            if time.monotonic() + _poll_interval >= _deadline:
+                break
+            await asyncio.sleep(_poll_interval)
+        DB_READ_WAIT_SECONDS.observe(time.monotonic() - _started)
+        DB_READ_ROUTING.labels(target='primary', reason="replica_lagging").inc()
+        return 'primary'
 
     def get_scoped_session(self, db_name: str = 'primary'):
-        if db_name not in self._ENGINES:
+        if db_name not in self._SCOPED_SESSIONS:
             raise Exception(f"{db_name} db not found")
-        _session = async_scoped_session(
-            session_factory=self._ENGINES[db_name],
-            scopefunc=current_task,
-        )
-        return _session
+        return self._SCOPED_SESSIONS[db_name]
 
-    async def session_dependency(self, db_name: str = 'primary'):
+    @asynccontextmanager
+    async def _outstanding(self, db_name: str):
+        _replica = self.replicas.replicas.get(db_name)
+        if _replica is None:
+            yield
+            return
+        _replica.outstanding += 1
+        try:
+            yield
+        finally:
+            _replica.outstanding -= 1
+
+    def session_dependency(self, db_name: str = 'primary'):
         async def _wrapper() -> AsyncSession:
-            if db_name not in self._ENGINES:
+            _db_name = await self.resolve_read_db(db_name)
+            if _db_name not in self._SESSION_FACTORIES:
                 raise Exception(f"{db_name} db not found")
-            _engine = self._ENGINES[db_name]
-            _async_session = async_sessionmaker(
-                bind=_engine,
-                autoflush=False,
-                autocommit=False,
-                expire_on_commit=False,
-            )
-            async with _async_session() as session:
+            _async_session = self._SESSION_FACTORIES[_db_name]
+            async with self._outstanding(_db_name), _async_session() as session:
                 yield session
+                await self._record_commit_lsn(session)
                 await session.close()
 
-        return _wrapper()
+        return _wrapper
 
-    async def scoped_session_dependency(self, db_name: str = 'primary'):
+    def scoped_session_dependency(self, db_name: str = 'primary'):
         async def _wrapper() -> AsyncSession:
-            _session = self.get_scoped_session(db_name=db_name)
-            async with _session() as session:
-                print(session.bind.pool.status())
-                yield session
-                await session.close()
+            _db_name = await self.resolve_read_db(db_name)
+            _session = self.get_scoped_session(db_name=_db_name)
+            try:
+                async with self._outstanding(_db_name), _session() as session:
+                    yield session
+                    await self._record_commit_lsn(session)
+                    await session.close()
+            finally:
+                await _session.remove()
 
-        return _wrapper()
+        return _wrapper
 
 
 class BaseModel(DeclarativeBase):
@@ -89,4 +301,10 @@ class BaseModel(DeclarativeBase):
         return to_snake_case(cls.__name__)
 
 
-DB_HELPER = DbHelper(urls=[APP_SETTINGS.DATABASE.POSTGRES_PRIMARY_DSN, APP_SETTINGS.DATABASE.POSTGRES_REPLICATION_DSN])
+_REPLICA_URLS = parse_replica_urls(APP_SETTINGS.DATABASE.POSTGRES_REPLICA_DSNS) or {
+    "replica-1": APP_SETTINGS.DATABASE.POSTGRES_REPLICATION_DSN
+}
+DB_HELPER = DbHelper(
+    urls=[APP_SETTINGS.DATABASE.POSTGRES_PRIMARY_DSN, *_REPLICA_URLS.values()],
+    replica_names=list(_REPLICA_URLS),
+)
@@ -0,0 +1,181 @@
+from abc import ABC, abstractmethod
+from typing import Any, ClassVar, TypeVar
+from uuid import UUID, uuid4
+
+from sqlalchemy import JSON, BigInteger, Integer, UniqueConstraint, insert, select
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.helpers.db import BaseModel
+from app.helpers.exceptions import ConflictError
+from app.settings import APP_SETTINGS
+
+_JSON = JSON().with_variant(JSONB, "postgresql")
+
+
+class StoredEvent(BaseModel):
+    # the log is ordered by a global position; uuid stays as a unique event id
+    uuid: Mapped[UUID] = mapped_column(
+        PG_UUID(as_uuid=True), default=uuid4, unique=True, nullable=False
+    )
+    position: Mapped[int] = mapped_column(
+        BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True
+    )
+    aggregate_type: Mapped[str] = mapped_column(nullable=False)
+    aggregate_id: Mapped[UUID] = mapped_column(PG_UUID(as_uuid=True), nullable=False)
+    version: Mapped[int] = mapped_column(nullable=False)
+    event_type: Mapped[str] = mapped_column(nullable=False)
+    payload: Mapped[dict] = mapped_column(_JSON, nullable=False)
+
+    __table_args__ = (
+        # appending a version that already exists is how concurrent writers collide
+        UniqueConstraint("aggregate_id", "version", name="uq_stored_event_aggregate_version"),
+    )
+
+
+class AggregateSnapshot(BaseModel):
+    aggregate_type: Mapped[str] = mapped_column(nullable=False)
+    aggregate_id: Mapped[UUID] = mapped_column(PG_UUID(as_uuid=True), nullable=False)
+    version: Mapped[int] = mapped_column(nullable=False)
+    state: Mapped[dict] = mapped_column(_JSON, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("aggregate_id", "version", name="uq_aggregate_snapshot_version"),
+    )
+
+
+class Aggregate(ABC):
+    """State rebuilt from a stream of events.
+
+    Subclasses set ``aggregate_type``, implement ``apply`` for every event type
+    and ``snapshot``/``restore`` for their state. Changes are made through
+    ``record``, which applies the event and keeps it until the aggregate is saved.
+    """
+
+    aggregate_type: ClassVar[str]
+
+    def __init__(self, aggregate_id: UUID):
+        self.id = aggregate_id
+        self.version = 0
+        # version the aggregate was loaded at, i.e. what the store is expected to hold
+        self.saved_version = 0
+        self.snapshot_version = 0
+        self.pending: list[tuple[str, dict]] = []
+
+    @abstractmethod
+    def apply(self, event_type: str, payload: dict):
+        ...
+
+    @abstractmethod
+    def snapshot(self) -> dict:
+        ...
+
+    @abstractmethod
+    def restore(self, state: dict):
+        ...
+
+    def record(self, event_type: str, payload: dict):
+        self.apply(event_type, payload)
+        self.version += 1
+        self.pending.append((event_type, payload))
+
+
+_A = TypeVar("_A", bound=Aggregate)
+
+
+class EventStore:
+    """Append-only event log with per-aggregate versions and periodic snapshots.
+
+    Appends are checked optimistically: each event takes the next version of its
+    aggregate, and a unique constraint rejects the append when another writer
+    got there first. Loading reads the newest snapshot and only the events after
+    it, so its cost is bounded by ``snapshot_interval`` rather than by history.
+    """
+
+    snapshot_interval: int = APP_SETTINGS.DATABASE.EVENT_SNAPSHOT_INTERVAL
+
+    @staticmethod
+    def _rows(aggregate: Aggregate) -> list[dict[str, Any]]:
+        return [
+            {
+                "uuid": uuid4(),
+                "aggregate_type": aggregate.aggregate_type,
+                "aggregate_id": aggregate.id,
+                "version": aggregate.saved_version + i,
+                "event_type": _event_type,
+                "payload": _payload,
+            }
+            for i, (_event_type, _payload) in enumerate(aggregate.pending, start=1)
+        ]
+
+    @staticmethod
+    async def save(db: AsyncSession, aggregate: Aggregate):
+        await EventStore.save_many(db, [aggregate])
+
+    @staticmethod
+    async def save_many(db: AsyncSession, aggregates: list[Aggregate]):
+        """Append the pending events of ``aggregates`` with one multi-row INSERT.
+
+        Raises ``ConflictError`` if any aggregate changed since it was loaded; the
+        append is made under a savepoint, so the session stays usable.
+        """
+        _rows = [_row for _aggregate in aggregates for _row in EventStore._rows(_aggregate)]
+        if not _rows:
+            return
+        _snapshotted = [
+            _aggregate
+            for _aggregate in aggregates
+            if _aggregate.version - _aggregate.snapshot_version >= EventStore.snapshot_interval
+        ]
+        _snapshots = [
+            {
+                "aggregate_type": _aggregate.aggregate_type,
+                "aggregate_id": _aggregate.id,
+                "version": _aggregate.version,
+                "state": _aggregate.snapshot(),
+            }
+            for _aggregate in _snapshotted
+        ]
+        try:
+            async with db.begin_nested():
+                await db.execute(insert(StoredEvent), _rows)
+                if _snapshots:
+                    await db.execute(insert(AggregateSnapshot), _snapshots)
+        except IntegrityError:
+            raise ConflictError(message="The aggregate was changed concurrently")
+        for _aggregate in aggregates:
+            _aggregate.saved_version = _aggregate.version
+            _aggregate.pending = []
+        for _aggregate in _snapshotted:
+            _aggregate.snapshot_version = _aggregate.version
+
+    @staticmethod
+    async def load(db: AsyncSession, aggregate_cls: type[_A], aggregate_id: UUID) -> _A | None:
+        _snapshot = await db.scalar(
+            select(AggregateSnapshot)
+            .where(AggregateSnapshot.aggregate_id == aggregate_id)
+            .order_by(AggregateSnapshot.version.desc())
+            .limit(1)
+        )
+        _aggregate = aggregate_cls(aggregate_id)
+        if _snapshot is not None:
+            _aggregate.restore(_snapshot.state)
+            _aggregate.version = _aggregate.snapshot_version = _snapshot.version
+        _events = await db.execute(
+            select(StoredEvent.event_type, StoredEvent.payload)
+            .where(
+                StoredEvent.aggregate_id == aggregate_id,
+                StoredEvent.version > _aggregate.version,
+            )
+            .order_by(StoredEvent.version)
+        )
+        for _event_type, _payload in _events:
+            _aggregate.apply(_event_type, _payload)
+            _aggregate.version += 1
+        if _aggregate.version == 0:
+            return None
+        _aggregate.saved_version = _aggregate.version
+        return _aggregate
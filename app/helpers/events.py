@@ -0,0 +1,94 @@
+import time
+from typing import Any, Awaitable, Callable
+
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.helpers.metrics import EVENT_ERRORS, EVENT_HANDLE_SECONDS, EVENT_UNROUTED
+
+Handler = Callable[[AsyncSession, Any], Awaitable[Any]]
+BatchHandler = Callable[[AsyncSession, list[Any]], Awaitable[Any]]
+
+
+class _Route:
+    """Everything needed to dispatch one event, prepared when its first handler registers."""
+
+    __slots__ = ("schema", "adapter", "handlers", "batch_handlers", "seconds", "errors")
+
+    def __init__(self, registry: str, event_name: str, schema: type[BaseModel]):
+        self.schema = schema
+        self.adapter = TypeAdapter(schema)
+        self.handlers: list[Handler] = []
+        self.batch_handlers: list[BatchHandler] = []
+        self.seconds = EVENT_HANDLE_SECONDS.labels(registry=registry, event=event_name)
+        self.errors = EVENT_ERRORS.labels(registry=registry, event=event_name)
+
+    async def handle(self, db: AsyncSession, payloads: list[dict]):
+        _started = time.perf_counter()
+        try:
+            _events = [self.adapter.validate_python(p) for p in payloads]
+            for _handler in self.batch_handlers:
+                await _handler(db, _events)
+            for _handler in self.handlers:
+                for _event in _events:
+                    await _handler(db, _event)
+        except Exception:
+            self.errors.inc(len(payloads))
+            raise
+        finally:
+            self.seconds.observe(time.perf_counter() - _started)
+
+
+class EventRegistry:
+    """Maps event names to a payload schema and the handlers of that event.
+
+    Handlers register at import time with ``on`` (called with ``(db, event)``) or
+    ``on_batch`` (called with ``(db, events)`` for every event of a batch). The
+    schema's validator is built once, when the event is first registered, and
+    dispatch is a single dict lookup per event name in a batch.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._routes: dict[str, _Route] = {}
+        self._unrouted = EVENT_UNROUTED.labels(registry=name)
+
+    def _route(self, event_name: str, schema: type[BaseModel]) -> _Route:
+        _route = self._routes.get(event_name)
+        if _route is None:
+            _route = self._routes[event_name] = _Route(self.name, event_name, schema)
+        elif _route.schema is not schema:
+            raise ValueError(
+                f"Event {event_name} is already registered with {_route.schema.__name__}"
+            )
+        return _route
+
+    def on(self, event_name: str, schema: type[BaseModel]):
+        def wrapper(func: Handler):
+            self._route(event_name, schema).handlers.append(func)
+            return func
+
+        return wrapper
+
+    def on_batch(self, event_name: str, schema: type[BaseModel]):
+        def wrapper(func: BatchHandler):
+            self._route(event_name, schema).batch_handlers.append(func)
+            return func
+
+        return wrapper
+
+    @property
+    def routes(self) -> dict[str, _Route]:
+        return self._routes
+
+    async def dispatch(self, db: AsyncSession, payloads: list[dict]):
+        """Validate ``payloads`` and run their handlers, grouped by event name."""
+        _by_event: dict[str, list[dict]] = {}
+        for _payload in payloads:
+            _by_event.setdefault(_payload.get("event"), []).append(_payload)
+        for _event_name, _payloads in _by_event.items():
+            _route = self._routes.get(_event_name)
+            if _route is None:
+                self._unrouted.inc(len(_payloads))
+                continue
+            await _route.handle(db, _payloads)
@@ -0,0 +1,298 @@
+import asyncio
+import random
+import time
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.helpers.cache import LRUTTLCache, SingleFlight
+from app.helpers.exceptions import ServiceUnavailableException
+from app.helpers.metrics import (
+    UPSTREAM_CACHE_REVALIDATIONS,
+    UPSTREAM_CIRCUIT_OPEN,
+    UPSTREAM_REQUEST_SECONDS,
+    UPSTREAM_RETRIES,
+)
+from app.settings import APP_SETTINGS
+
+try:
+    import h2  # noqa: F401
+except ImportError:
+    h2 = None
+
+RETRYABLE_STATUS_CODES = {502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+# request options that do not change what the upstream answers
+_CACHE_NEUTRAL_OPTIONS = {"timeout", "follow_redirects", "extensions"}
+
+
+class CircuitBreaker:
+    """Fails fast once an upstream keeps failing.
+
+    Transport errors and 5xx responses are failures. After ``failure_threshold``
+    consecutive failures the circuit opens and calls are refused for
+    ``reset_seconds``. Then a single trial call is let through: its success
+    closes the circuit, its failure opens it again. A trial that is not recorded
+    within ``reset_seconds`` is given up and another one let through.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            failure_threshold: int = APP_SETTINGS.API_CALL.CIRCUIT_FAILURE_THRESHOLD,
+            reset_seconds: float = APP_SETTINGS.API_CALL.CIRCUIT_RESET_SECONDS,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._trial_started: float | None = None
+        self._open = UPSTREAM_CIRCUIT_OPEN.labels(upstream=name)
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        _now = time.monotonic()
+        if _now - self.opened_at < self.reset_seconds:
+            return False
+        if self._trial_started is not None and _now - self._trial_started < self.reset_seconds:
+            return False
+        self._trial_started = _now
+        return True
+
+    def release(self):
+        """Give up a pending trial without counting it, e.g. when its caller went away."""
+        self._trial_started = None
+
+    def record(self, ok: bool):
+        self._trial_started = None
+        if ok:
+            self.failures = 0
+            self.opened_at = None
+            self._open.set(0)
+            return
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._open.set(1)
+
+
+class CachedResponse:
+    __slots__ = ("response", "fresh_until", "etag", "last_modified")
+
+    def __init__(self, response: httpx.Response, fresh_until: float):
+        self.response = response
+        self.fresh_until = fresh_until
+        self.etag = response.headers.get("etag")
+        self.last_modified = response.headers.get("last-modified")
+
+
+class ResponseCache:
+    """Caches successful GET responses of one upstream and coalesces identical misses.
+
+    Responses are keyed by URL, query parameters and request headers, and stay
+    fresh for their ``Cache-Control`` ``max-age`` (``HTTP_CACHE_DEFAULT_TTL_SECONDS``
+    without one, never longer than ``HTTP_CACHE_MAX_TTL_SECONDS``). ``no-store``
+    responses are not cached and ``no-cache`` ones are revalidated on every use.
+    A stale response with an ``ETag`` or ``Last-Modified`` is revalidated with a
+    conditional request, and a ``304`` renews it without a new body.
+    """
+
+    def __init__(self, name: str):
+        _settings = APP_SETTINGS.API_CALL
+        self.default_ttl = _settings.HTTP_CACHE_DEFAULT_TTL_SECONDS
+        self.max_ttl = _settings.HTTP_CACHE_MAX_TTL_SECONDS
+        self.backend = LRUTTLCache(
+            f"upstream:{name}",
+            max_entries=_settings.HTTP_CACHE_MAX_ENTRIES,
+            ttl=self.max_ttl + _settings.HTTP_CACHE_STALE_SECONDS,
+        )
+        self._flight = SingleFlight()
+        self._not_modified = UPSTREAM_CACHE_REVALIDATIONS.labels(name, "not_modified")
+        self._modified = UPSTREAM_CACHE_REVALIDATIONS.labels(name, "modified")
+
+    @staticmethod
+    def key(url: str, kwargs: dict) -> tuple | None:
+        if not set(kwargs) <= {"params", "headers", *_CACHE_NEUTRAL_OPTIONS}:
+            return None
+        return (
+            str(url),
+            str(httpx.QueryParams(kwargs.get("params"))),
+            tuple(sorted(httpx.Headers(kwargs.get("headers")).multi_items())),
+        )
+
+    def _freshness(self, response: httpx.Response) -> float | None:
+        """Seconds ``response`` stays fresh, or ``None`` if it must not be cached."""
+        _directives = {}
+        for _directive in response.headers.get("cache-control", "").split(","):
+            _name, _, _value = _directive.strip().partition("=")
+            _directives[_name.lower()] = _value.strip('" ')
+        if "no-store" in _directives or response.headers.get("vary") == "*":
+            return None
+        if "no-cache" in _directives:
+            return 0
+        _max_age = _directives.get("s-maxage") or _directives.get("max-age")
+        try:
+            _ttl = float(_max_age) if _max_age else self.default_ttl
+            _ttl -= float(response.headers.get("age", 0))
+        except ValueError:
+            return 0
+        return min(max(_ttl, 0), self.max_ttl)
+
+    def _store(self, key: tuple, response: httpx.Response) -> CachedResponse | None:
+        _ttl = self._freshness(response)
+        if _ttl is None:
+            self.backend.delete(key)
+            return None
+        _entry = CachedResponse(response, time.monotonic() + _ttl)
+        if _ttl or _entry.etag or _entry.last_modified:
+            self.backend.set(key, _entry)
+        return _entry
+
+    async def _fetch(
+            self,
+            upstream: "Upstream",
+            key: tuple,
+            entry: CachedResponse | None,
+            url: str,
+            kwargs: dict,
+    ) -> httpx.Response:
+        _kwargs = kwargs
+        if entry is not None and (entry.etag or entry.last_modified):
+            _headers = httpx.Headers(kwargs.get("headers"))
+            if entry.etag:
+                _headers["if-none-match"] = entry.etag
+            if entry.last_modified:
+                _headers["if-modified-since"] = entry.last_modified
+            _kwargs = {**kwargs, "headers": _headers}
+        _response = await upstream.request("GET", url, **_kwargs)
+        if _response.status_code == 304 and entry is not None:
+            self._not_modified.inc()
+            # a 304 carries the new freshness but not the body
+            entry.response.headers.update(
+                {k: v for k, v in _response.headers.items() if k in ("cache-control", "age", "etag", "expires")}
+            )
+            self._store(key, entry.response)
+            return entry.response
+        if _kwargs is not kwargs:
+            self._modified.inc()
+        if _response.status_code == 200:
+            self._store(key, _response)
+        return _response
+
+    async def get(self, upstream: "Upstream", url: str, **kwargs) -> httpx.Response:
+        _key = self.key(url, kwargs)
+        if _key is None:
+            return await upstream.request("GET", url, **kwargs)
+        _entry = self.backend.get(_key)
+        if _entry is not None and _entry.fresh_until > time.monotonic():
+            return _entry.response
+        return await self._flight.do(_key, lambda: self._fetch(upstream, _key, _entry, url, kwargs))
+
+    def clear(self):
+        self.backend.clear()
+
+
+class Upstream:
+    """A pooled keep-alive client for one base URL, with retries and a circuit breaker."""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.name = urlsplit(base_url).netloc or base_url
+        _settings = APP_SETTINGS.API_CALL
+        _http2 = _settings.HTTP2_ENABLED and h2 is not None
+        if _settings.HTTP2_ENABLED and not _http2:
+            print("HTTP/2 needs the h2 package, using HTTP/1.1")
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            http2=_http2,
+            limits=httpx.Limits(
+                max_connections=_settings.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=_settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=_settings.HTTP_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+            timeout=httpx.Timeout(
+                _settings.HTTP_TIMEOUT_SECONDS, connect=_settings.HTTP_CONNECT_TIMEOUT_SECONDS
+            ),
+        )
+        self.breaker = CircuitBreaker(self.name)
+        self.retries = _settings.HTTP_RETRIES
+        self.backoff = _settings.HTTP_RETRY_BACKOFF_MS / 1000
+        self.backoff_max = _settings.HTTP_RETRY_BACKOFF_MAX_MS / 1000
+        self.cache = ResponseCache(self.name) if _settings.HTTP_CACHE_ENABLED else None
+
+    def _delay(self, attempt: int) -> float:
+        # full jitter keeps retrying clients from arriving in lockstep
+        return random.uniform(0, min(self.backoff_max, self.backoff * 2 ** attempt))
+
+    async def request(self, method: str, url: str, idempotent: bool | None = None, **kwargs) -> httpx.Response:
+        """Send a request, retrying failures that are safe to retry.
+
+        Connection failures are always retried, since the request never left. Timeouts
+        and 502/503/504 responses are only retried for idempotent requests.
+        """
+        _method = method.upper()
+        _idempotent = _method in IDEMPOTENT_METHODS if idempotent is None else idempotent
+        _attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise ServiceUnavailableException(message=f"{self.name} is unavailable")
+            _started = time.perf_counter()
+            _outcome = "error"
+            try:
+                _response = await self.client.request(_method, url, **kwargs)
+            except httpx.TransportError as e:
+                _outcome = type(e).__name__
+                self.breaker.record(ok=False)
+                _retry = isinstance(e, httpx.ConnectError) or _idempotent
+                if not _retry or _attempt >= self.retries:
+                    raise
+            except asyncio.CancelledError:
+                # the caller gave up, which says nothing about the upstream
+                self.breaker.release()
+                raise
+            except BaseException:
+                self.breaker.record(ok=False)
+                raise
+            else:
+                _outcome = str(_response.status_code)
+                _failed = _response.status_code in RETRYABLE_STATUS_CODES
+                self.breaker.record(ok=_response.status_code < 500)
+                if not (_failed and _idempotent) or _attempt >= self.retries:
+                    return _response
+            finally:
+                UPSTREAM_REQUEST_SECONDS.labels(self.name, _method, _outcome).observe(
+                    time.perf_counter() - _started
+                )
+            UPSTREAM_RETRIES.labels(self.name, _method).inc()
+            await asyncio.sleep(self._delay(_attempt))
+            _attempt += 1
+
+    async def get(self, url: str, cache: bool = True, **kwargs) -> httpx.Response:
+        """GET through the response cache, unless it is disabled or ``cache`` is false."""
+        if self.cache is None or not cache:
+            return await self.request("GET", url, **kwargs)
+        return await self.cache.get(self, url, **kwargs)
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class HttpClientPool:
+    """One ``Upstream`` per base URL for the lifetime of the app; closed in ``lifespan``."""
+
+    def __init__(self):
+        self._upstreams: dict[str, Upstream] = {}
+
+    def get(self, base_url: str) -> Upstream:
+        _upstream = self._upstreams.get(base_url)
+        if _upstream is None:
+            _upstream = self._upstreams[base_url] = Upstream(base_url)
+        return _upstream
+
+    async def close(self):
+        _upstreams, self._upstreams = self._upstreams, {}
+        await asyncio.gather(*(u.close() for u in _upstreams.values()))
+
+
+HTTP_CLIENTS = HttpClientPool()
@@ -0,0 +1,106 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+CACHE_HITS = Counter("app_cache_hits_total", "Read-model cache hits", ["cache"])
+CACHE_MISSES = Counter("app_cache_misses_total", "Read-model cache misses", ["cache"])
+CACHE_EVICTIONS = Counter("app_cache_evictions_total", "Read-model cache evictions", ["cache"])
+CACHE_SIZE = Gauge("app_cache_entries", "Entries held by a read-model cache", ["cache"])
+
+DB_REPLICA_LAG_BYTES = Gauge(
+    "app_db_replica_lag_bytes",
+    "WAL bytes a replica is behind the newest known primary position",
+    ["replica"],
+)
+DB_REPLICA_HEALTHY = Gauge(
+    "app_db_replica_healthy", "Whether a replica is admitted to serve reads", ["replica"]
+)
+DB_READ_ROUTING = Counter(
+    "app_db_read_routing_total", "Reads routed by replay position", ["target", "reason"]
+)
+DB_READ_WAIT_SECONDS = Histogram(
+    "app_db_read_wait_seconds",
+    "Time reads waited for the replica to replay the client's last write",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+
+DB_POOL_SIZE = Gauge("app_db_pool_size", "Configured connection pool size", ["engine"])
+DB_POOL_CHECKED_OUT = Gauge(
+    "app_db_pool_checked_out", "Connections currently checked out of the pool", ["engine"]
+)
+DB_POOL_OVERFLOW = Gauge(
+    "app_db_pool_overflow", "Connections open beyond the configured pool size", ["engine"]
+)
+DB_POOL_WAITERS = Gauge(
+    "app_db_pool_waiters", "Callers currently waiting to acquire a connection", ["engine"]
+)
+DB_POOL_ACQUIRE_SECONDS = Histogram(
+    "app_db_pool_acquire_seconds",
+    "Time spent acquiring a connection from the pool",
+    ["engine"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+EVENT_HANDLE_SECONDS = Histogram(
+    "app_event_handle_seconds",
+    "Time spent validating and handling consumed events",
+    ["registry", "event"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+EVENT_ERRORS = Counter(
+    "app_event_errors_total", "Consumed events whose validation or handling failed", ["registry", "event"]
+)
+EVENT_UNROUTED = Counter(
+    "app_event_unrouted_total", "Consumed events with no registered handler", ["registry"]
+)
+
+PROJECTION_EVENTS = Counter(
+    "app_projection_events_total", "Events applied by a projection", ["projection"]
+)
+PROJECTION_EVENTS_PER_SECOND = Gauge(
+    "app_projection_events_per_second", "Throughput of a projection's last batch", ["projection"]
+)
+PROJECTION_LAG_EVENTS = Gauge(
+    "app_projection_lag_events", "Events in the log not yet applied by a projection", ["projection"]
+)
+PROJECTION_LAG_SECONDS = Gauge(
+    "app_projection_lag_seconds",
+    "Age of the last event applied by a projection while it is behind",
+    ["projection"],
+)
+
+UPSTREAM_REQUEST_SECONDS = Histogram(
+    "app_upstream_request_seconds",
+    "Latency of outbound HTTP requests, per attempt",
+    ["upstream", "method", "outcome"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+UPSTREAM_RETRIES = Counter(
+    "app_upstream_retries_total", "Outbound HTTP requests retried", ["upstream", "method"]
+)
+UPSTREAM_CIRCUIT_OPEN = Gauge(
+    "app_upstream_circuit_open", "Whether the circuit breaker of an upstream is open", ["upstream"]
+)
+UPSTREAM_CACHE_REVALIDATIONS = Counter(
+    "app_upstream_cache_revalidations_total",
+    "Conditional requests made for stale cached upstream responses",
+    ["upstream", "outcome"],
+)
+
+PASSWORD_HASH_PENDING = Gauge(
+    "app_password_hash_pending", "Password hashes queued or running on the hashing pool"
+)
+PASSWORD_HASH_SECONDS = Histogram(
+    "app_password_hash_seconds",
+    "Time spent in bcrypt per call",
+    ["operation"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+PASSWORD_HASH_REJECTED = Counter(
+    "app_password_hash_rejected_total", "Password hashes refused because the hashing pool was saturated"
+)
+
+STAGE_SECONDS = Histogram(
+    "app_stage_seconds",
+    "Time spent in a traced stage of sampled requests",
+    ["layer", "operation"],
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
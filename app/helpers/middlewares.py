@@ -1,11 +1,25 @@
+import hmac
 from typing import Optional
 
-from fastapi import Depends, Request
+from fastapi import Depends, Header, Request
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from fastapi.security.utils import get_authorization_scheme_param
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
+from app.helpers.cryptography import TOKEN_CACHE, jwt_decode_cached
+from app.helpers.db import CONSISTENCY, ConsistencyContext
 from app.helpers.exceptions import AuthenticationFailedError
-from app.helpers.cryptography import jwt_decode
+from app.helpers.rabbitmq import broadcast_event
+from app.helpers.replicas import lsn_to_int
+from app.helpers.tracing import TRACE, start_trace
+from app.settings import APP_SETTINGS
+
+CONSISTENCY_HEADER = "X-Consistency-Token"
+SERVER_TIMING_HEADER = "Server-Timing"
+API_KEY_HEADER = "X-API-Key"
 
 
 class CustomHTTPBearer(HTTPBearer):
@@ -31,7 +45,89 @@ security_bearer = CustomHTTPBearer()
 async def get_user_organization(
         credentials: HTTPAuthorizationCredentials = Depends(security_bearer),
 ):
-    organization_id = jwt_decode(credentials.credentials).get("organizationId")
+    organization_id = jwt_decode_cached(credentials.credentials).get("organizationId")
     if not organization_id:
         raise AuthenticationFailedError
     return organization_id
+
+
+async def require_api_key(api_key: str | None = Header(default=None, alias=API_KEY_HEADER)):
+    if not api_key or not hmac.compare_digest(api_key, APP_SETTINGS.API_V1.API_KEY):
+        raise AuthenticationFailedError(message="Invalid API key")
+
+
+class TokenRevokedEvent(BaseModel):
+    # hex sha256 digests of the revoked tokens
+    digests: list[str] = []
+    expires_at: float | None = None
+
+
+@broadcast_event.on('token_revoked', TokenRevokedEvent)
+async def _revoke_tokens(db: AsyncSession, payload: TokenRevokedEvent):
+    for _digest in payload.digests:
+        TOKEN_CACHE.revoke_digest(bytes.fromhex(_digest), payload.expires_at)
+
+
+class ConsistencyMiddleware:
+    """Carries the client's last observed WAL position in and out of a request.
+
+    The ``X-Consistency-Token`` request header tells replica reads which position
+    they must include. Requests that write to the primary return the new position
+    in the same header, for the client to send on its next reads.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        _ctx = ConsistencyContext()
+        _token = Headers(scope=scope).get(CONSISTENCY_HEADER)
+        if _token:
+            try:
+                _ctx.required_lsn = lsn_to_int(_token)
+            except ValueError:
+                pass
+        _reset = CONSISTENCY.set(_ctx)
+
+        async def _send(message: Message):
+            if message["type"] == "http.response.start" and _ctx.commit_lsn:
+                MutableHeaders(scope=message)[CONSISTENCY_HEADER] = _ctx.commit_lsn
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            CONSISTENCY.reset(_reset)
+
+
+class TracingMiddleware:
+    """Opens a ``Trace`` for sampled requests and optionally reports it in ``Server-Timing``.
+
+    The header is written when the response starts, so it covers everything done
+    before the first byte of the body.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        _trace = start_trace()
+        if _trace is None:
+            return await self.app(scope, receive, send)
+        _reset = TRACE.set(_trace)
+
+        async def _send(message: Message):
+            if message["type"] == "http.response.start" and APP_SETTINGS.TRACING.SERVER_TIMING:
+                MutableHeaders(scope=message).append(SERVER_TIMING_HEADER, _trace.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            _trace.closed = True
+            TRACE.reset(_reset)
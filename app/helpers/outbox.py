@@ -0,0 +1,181 @@
+import asyncio
+import datetime
+from contextlib import asynccontextmanager
+
+from aio_pika import DeliveryMode
+from sqlalchemy import JSON, Index, func, or_, select, update
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.helpers.codecs import codec_for_exchange
+from app.helpers.db import DB_HELPER, BaseModel
+from app.helpers.tracing import traced
+from app.settings import APP_SETTINGS
+
+
+class OutboxMessage(BaseModel):
+    exchange: Mapped[str] = mapped_column(nullable=False)
+    routing_key: Mapped[str] = mapped_column(nullable=False)
+    payload: Mapped[dict] = mapped_column(JSON().with_variant(JSONB, "postgresql"), nullable=False)
+    sent_at: Mapped[datetime.datetime | None] = mapped_column(nullable=True)
+    attempts: Mapped[int] = mapped_column(nullable=False, default=0)
+    next_attempt_at: Mapped[datetime.datetime | None] = mapped_column(nullable=True)
+
+    __table_args__ = (
+        Index(
+            "ix_outbox_message_unsent",
+            "created_at",
+            postgresql_where=sent_at.is_(None),
+        ),
+    )
+
+
+@traced("outbox")
+def stage_event(
+        db: AsyncSession,
+        event_name: str,
+        payload: dict | None = None,
+        routing_key: str = APP_SETTINGS.RABBITMQ.ROUTING_KEY,
+        exchange: str = APP_SETTINGS.RABBITMQ.EXCHANGE,
+) -> OutboxMessage:
+    """Add an event to the session's outbox; it is published once the session commits."""
+    _message = OutboxMessage(
+        exchange=exchange,
+        routing_key=routing_key,
+        payload={'event': event_name, **(payload or {})},
+    )
+    db.add(_message)
+    return _message
+
+
+class OutboxRelay:
+    """Publishes committed outbox rows to RabbitMQ and marks them sent.
+
+    Rows are claimed with ``FOR UPDATE SKIP LOCKED``, so any number of relays can
+    run side by side without publishing the same row twice. A batch is published
+    persistently with all messages in flight and their confirms awaited together.
+    A message that fails is retried with exponential backoff, up to ``max_attempts``
+    times, so it does not hold back the messages behind it.
+    """
+
+    def __init__(
+            self,
+            client,
+            batch_size: int = APP_SETTINGS.RABBITMQ.OUTBOX_BATCH_SIZE,
+            poll_interval_ms: float = APP_SETTINGS.RABBITMQ.OUTBOX_POLL_INTERVAL_MS,
+            max_attempts: int = APP_SETTINGS.RABBITMQ.OUTBOX_MAX_ATTEMPTS,
+            retry_backoff_ms: float = APP_SETTINGS.RABBITMQ.OUTBOX_RETRY_BACKOFF_MS,
+            retry_backoff_max_ms: float = APP_SETTINGS.RABBITMQ.OUTBOX_RETRY_BACKOFF_MAX_MS,
+    ):
+        self.client = client
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval_ms / 1000
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff_ms / 1000
+        self.retry_backoff_max = retry_backoff_max_ms / 1000
+        self._task: asyncio.Task | None = None
+
+    @traced("outbox", "publish")
+    async def _publish(self, messages: list[OutboxMessage]) -> list[BaseException | None]:
+        _by_exchange = {}
+        for i, _message in enumerate(messages):
+            _by_exchange.setdefault(_message.exchange, []).append(i)
+        _results = [None] * len(messages)
+        for _exchange, _indexes in _by_exchange.items():
+            _codec = codec_for_exchange(_exchange)
+            _confirms = await self.client.publisher.publish_batch(
+                [
+                    (
+                        messages[i].routing_key,
+                        _codec.encode(messages[i].payload),
+                        {
+                            "message_id": str(messages[i].uuid),
+                            "content_type": _codec.content_type,
+                            "delivery_mode": DeliveryMode.PERSISTENT,
+                        },
+                    )
+                    for i in _indexes
+                ],
+                exchange=_exchange,
+            )
+            for i, _confirm in zip(_indexes, _confirms):
+                _results[i] = _confirm
+        return _results
+
+    def _retry_at(self, now: datetime.datetime, attempts: int) -> datetime.datetime:
+        _delay = min(self.retry_backoff * 2 ** (attempts - 1), self.retry_backoff_max)
+        return now + datetime.timedelta(seconds=_delay)
+
+    async def relay_batch(self) -> int:
+        _now = datetime.datetime.utcnow()
+        async with asynccontextmanager(DB_HELPER.session_dependency())() as db:
+            _stmt = (
+                select(OutboxMessage)
+                .where(
+                    OutboxMessage.sent_at.is_(None),
+                    OutboxMessage.attempts < self.max_attempts,
+                    or_(
+                        OutboxMessage.next_attempt_at.is_(None),
+                        OutboxMessage.next_attempt_at <= _now,
+                    ),
+                )
+                .order_by(OutboxMessage.created_at)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            _messages = list(await db.scalars(_stmt))
+            if not _messages:
+                return 0
+            _results = await self._publish(_messages)
+            _sent = [m.uuid for m, r in zip(_messages, _results) if r is None]
+            _failed = [m for m, r in zip(_messages, _results) if r is not None]
+            if _sent:
+                await db.execute(
+                    update(OutboxMessage)
+                    .where(OutboxMessage.uuid.in_(_sent))
+                    .values(sent_at=func.now())
+                )
+            if _failed:
+                _given_up = sum(m.attempts + 1 >= self.max_attempts for m in _failed)
+                print(
+                    f"Failed to relay {len(_failed)} outbox messages, "
+                    f"{_given_up} of them for the last time"
+                )
+                await db.execute(
+                    update(OutboxMessage),
+                    [
+                        {
+                            "uuid": m.uuid,
+                            "attempts": m.attempts + 1,
+                            "next_attempt_at": self._retry_at(_now, m.attempts + 1),
+                        }
+                        for m in _failed
+                    ],
+                )
+            await db.commit()
+        return len(_messages)
+
+    async def run(self):
+        while True:
+            try:
+                _relayed = await self.relay_batch()
+            except Exception as e:
+                print(e)
+                _relayed = 0
+            if _relayed < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
@@ -0,0 +1,209 @@
+"""On-demand statistical profiler of the event-loop thread.
+
+Nothing runs until a session is started, so it costs nothing while idle.
+During a session a background thread reads the loop thread's current frame
+every ``interval_ms`` through ``sys._current_frames`` and counts the stacks it
+sees. Meanwhile a watchdog task on the loop measures how late its own wakeups
+are. A wakeup late by ``slow_callback_ms`` or more means one callback held the
+loop that long, and it is reported with the stack sampled most often while it
+ran. This works the same on uvloop, whose handles cannot be patched.
+"""
+import asyncio
+import bisect
+import sys
+import threading
+import time
+
+from app.helpers.exceptions import ConflictError
+from app.settings import APP_SETTINGS
+
+
+def _short_filename(filename: str) -> str:
+    for _path in sorted((p for p in sys.path if p), key=len, reverse=True):
+        if filename.startswith(_path):
+            return filename[len(_path):].lstrip("/")
+    return filename
+
+
+class ProfilingSession:
+    def __init__(
+            self,
+            thread_id: int,
+            interval_ms: float = APP_SETTINGS.PROFILER.INTERVAL_MS,
+            slow_callback_ms: float = APP_SETTINGS.PROFILER.SLOW_CALLBACK_MS,
+            max_depth: int = APP_SETTINGS.PROFILER.MAX_DEPTH,
+    ):
+        self.thread_id = thread_id
+        self.interval = interval_ms / 1000
+        self.slow_callback = slow_callback_ms / 1000
+        self.max_depth = max_depth
+        self.started = self.stopped = 0.0
+        # frames and stacks are interned: a stack is a tuple of frame ids, root first
+        self.frames: list[tuple[str, str, int]] = []
+        self._frame_ids: dict = {}
+        self.stacks: list[tuple[int, ...]] = []
+        self._stack_ids: dict[tuple[int, ...], int] = {}
+        self.counts: list[int] = []
+        self.sample_times: list[float] = []
+        self.sample_stacks: list[int] = []
+        self.lags: list[float] = []
+        self.slow_callbacks: list[tuple[float, float, int | None]] = []
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._watchdog: asyncio.Task | None = None
+
+    def _frame_id(self, code) -> int:
+        _id = self._frame_ids.get(code)
+        if _id is None:
+            _id = self._frame_ids[code] = len(self.frames)
+            self.frames.append((code.co_name, _short_filename(code.co_filename), code.co_firstlineno))
+        return _id
+
+    def _record(self, frame):
+        _stack = []
+        while frame is not None and len(_stack) < self.max_depth:
+            _stack.append(self._frame_id(frame.f_code))
+            frame = frame.f_back
+        _stack = tuple(reversed(_stack))
+        _id = self._stack_ids.get(_stack)
+        if _id is None:
+            _id = self._stack_ids[_stack] = len(self.stacks)
+            self.stacks.append(_stack)
+            self.counts.append(0)
+        self.counts[_id] += 1
+        self.sample_times.append(time.perf_counter())
+        self.sample_stacks.append(_id)
+
+    def _sample(self):
+        _next = time.perf_counter()
+        while not self._stop.is_set():
+            _frame = sys._current_frames().get(self.thread_id)
+            if _frame is not None:
+                self._record(_frame)
+            del _frame
+            _next += self.interval
+            _delay = _next - time.perf_counter()
+            if _delay > 0:
+                self._stop.wait(_delay)
+            else:
+                _next = time.perf_counter()
+
+    def _dominant_stack(self, started: float, ended: float) -> int | None:
+        _first = bisect.bisect_left(self.sample_times, started)
+        _last = bisect.bisect_right(self.sample_times, ended)
+        _seen: dict[int, int] = {}
+        for _id in self.sample_stacks[_first:_last]:
+            _seen[_id] = _seen.get(_id, 0) + 1
+        return max(_seen, key=_seen.get) if _seen else None
+
+    async def _watch(self):
+        _tick = APP_SETTINGS.PROFILER.LAG_TICK_MS / 1000
+        _last = time.perf_counter()
+        while True:
+            await asyncio.sleep(_tick)
+            _now = time.perf_counter()
+            _lag = max(0.0, _now - _last - _tick)
+            self.lags.append(_lag)
+            if _lag >= self.slow_callback:
+                self.slow_callbacks.append((_last + _tick, _lag, self._dominant_stack(_last + _tick, _now)))
+            _last = _now
+
+    async def run(self, seconds: float):
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample, name="loop-profiler", daemon=True)
+        self._thread.start()
+        self._watchdog = asyncio.create_task(self._watch())
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            self._watchdog.cancel()
+            try:
+                await self._watchdog
+            except asyncio.CancelledError:
+                pass
+            self._stop.set()
+            await asyncio.to_thread(self._thread.join)
+            self.stopped = time.perf_counter()
+
+    def _frame_name(self, frame_id: int) -> str:
+        _name, _file, _line = self.frames[frame_id]
+        return f"{_name} ({_file}:{_line})"
+
+    def _stack_name(self, stack_id: int) -> str:
+        return ";".join(self._frame_name(_frame) for _frame in self.stacks[stack_id])
+
+    def collapsed(self) -> str:
+        """Stacks in the folded format of flamegraph.pl and speedscope, one per line."""
+        _order = sorted(range(len(self.stacks)), key=self.counts.__getitem__, reverse=True)
+        return "".join(f"{self._stack_name(i)} {self.counts[i]}\n" for i in _order)
+
+    def speedscope(self) -> dict:
+        _interval_ms = self.interval * 1000
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "exporter": "walle-profiler",
+            "name": "event loop",
+            "shared": {
+                "frames": [{"name": n, "file": f, "line": l} for n, f, l in self.frames],
+            },
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": f"event loop thread {self.thread_id}",
+                    "unit": "milliseconds",
+                    "startValue": 0,
+                    "endValue": sum(self.counts) * _interval_ms,
+                    "samples": [list(_stack) for _stack in self.stacks],
+                    "weights": [_count * _interval_ms for _count in self.counts],
+                }
+            ],
+        }
+
+    def loop_report(self, top: int = 20) -> dict:
+        _lags = sorted(self.lags)
+
+        def _at(q: float) -> float:
+            return round(_lags[min(len(_lags) - 1, int(q * len(_lags)))] * 1000, 3) if _lags else 0.0
+
+        _slowest = sorted(self.slow_callbacks, key=lambda s: s[1], reverse=True)[:top]
+        return {
+            "seconds": round(self.stopped - self.started, 3),
+            "samples": len(self.sample_times),
+            "lag_ms": {
+                "mean": round(sum(_lags) / len(_lags) * 1000, 3) if _lags else 0.0,
+                "p50": _at(0.50),
+                "p99": _at(0.99),
+                "max": _at(1.0),
+            },
+            "slow_callback_threshold_ms": self.slow_callback * 1000,
+            "slow_callbacks": len(self.slow_callbacks),
+            "slowest": [
+                {
+                    "at_seconds": round(_at_time - self.started, 3),
+                    "duration_ms": round(_duration * 1000, 3),
+                    "frame": None if _stack is None else self._frame_name(self.stacks[_stack][-1]),
+                    "stack": None if _stack is None else self._stack_name(_stack),
+                }
+                for _at_time, _duration, _stack in _slowest
+            ],
+        }
+
+
+class LoopProfiler:
+    """Runs one ``ProfilingSession`` at a time on the calling event loop's thread."""
+
+    def __init__(self):
+        self.active: ProfilingSession | None = None
+
+    async def profile(self, seconds: float, **options) -> ProfilingSession:
+        if self.active is not None:
+            raise ConflictError(message="A profiling session is already running")
+        self.active = ProfilingSession(threading.get_ident(), **options)
+        try:
+            await self.active.run(min(seconds, APP_SETTINGS.PROFILER.MAX_SECONDS))
+            return self.active
+        finally:
+            self.active = None
+
+
+LOOP_PROFILER = LoopProfiler()
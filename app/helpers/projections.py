@@ -0,0 +1,421 @@
+import asyncio
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from typing import ClassVar
+
+from sqlalchemy import (
+    BigInteger,
+    Index,
+    Integer,
+    MetaData,
+    PrimaryKeyConstraint,
+    Table,
+    Text,
+    UniqueConstraint,
+    and_,
+    bindparam,
+    cast,
+    column,
+    exists,
+    func,
+    null,
+    or_,
+    select,
+    table,
+    text,
+    update,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.helpers.db import DB_HELPER, BaseModel
+from app.helpers.event_store import StoredEvent
+from app.helpers.exceptions import ConflictError
+from app.helpers.metrics import (
+    PROJECTION_EVENTS,
+    PROJECTION_EVENTS_PER_SECOND,
+    PROJECTION_LAG_EVENTS,
+    PROJECTION_LAG_SECONDS,
+)
+from app.settings import APP_SETTINGS
+
+_EVENT_COLUMNS = (
+    StoredEvent.position,
+    StoredEvent.aggregate_type,
+    StoredEvent.aggregate_id,
+    StoredEvent.version,
+    StoredEvent.event_type,
+    StoredEvent.payload,
+    StoredEvent.created_at,
+)
+
+
+class ProjectionCheckpoint(BaseModel):
+    name: Mapped[str] = mapped_column(nullable=False, unique=True)
+    position: Mapped[int] = mapped_column(
+        BigInteger().with_variant(Integer, "sqlite"), nullable=False, default=0
+    )
+
+
+def _dialect_insert(db: AsyncSession, table: Table):
+    if db.bind.dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+
+def _snapshot_bounds(db: AsyncSession) -> tuple:
+    """Ids of the oldest running and of the next transaction, ``NULL`` outside Postgres."""
+    if db.bind.dialect.name != "postgresql":
+        return null(), null()
+    _snapshot = func.pg_current_snapshot()
+    return (
+        cast(cast(func.pg_snapshot_xmin(_snapshot), Text), BigInteger),
+        cast(cast(func.pg_snapshot_xmax(_snapshot), Text), BigInteger),
+    )
+
+
+class Projection(ABC):
+    """Turns events of one aggregate type into rows of a read table.
+
+    ``rows`` returns at most one dict per key for a batch of events. Rows holding
+    every column of ``table`` are upserted with ``ON CONFLICT DO UPDATE`` on
+    ``key``, so applying an event twice is harmless; partial rows update existing
+    rows by key.
+    """
+
+    name: ClassVar[str]
+    aggregate_type: ClassVar[str]
+    table: ClassVar[Table]
+    key: ClassVar[str] = "uuid"
+
+    @abstractmethod
+    def rows(self, events: list) -> list[dict]:
+        ...
+
+    async def apply(self, db: AsyncSession, events: list, table: Table | None = None):
+        _table = self.table if table is None else table
+        _upserts, _updates = [], []
+        for _row in self.rows(events):
+            (_upserts if len(_row) == len(_table.columns) else _updates).append(_row)
+        if _upserts:
+            _stmt = _dialect_insert(db, _table)
+            _stmt = _stmt.on_conflict_do_update(
+                index_elements=[self.key],
+                set_={c.name: _stmt.excluded[c.name] for c in _table.columns if c.name != self.key},
+            )
+            await db.execute(_stmt, _upserts)
+        _by_columns: dict[tuple, list[dict]] = {}
+        for _row in _updates:
+            _by_columns.setdefault(tuple(sorted(_row)), []).append({**_row, "_key": _row[self.key]})
+        for _columns, _rows in _by_columns.items():
+            await db.execute(
+                update(_table)
+                .where(_table.c[self.key] == bindparam("_key"))
+                .values({c: bindparam(c) for c in _columns if c != self.key}),
+                _rows,
+            )
+
+
+class ProjectionRunner:
+    """Applies new events to a projection in batches and records a checkpoint.
+
+    Each batch is applied and checkpointed in one transaction, with the
+    checkpoint row locked, so a batch is never half applied and concurrent
+    runners of the same projection take turns. ``rebuild`` replays the whole log
+    into a fresh table in parallel partitions and swaps it in.
+
+    Positions are taken when an event is inserted, not when it commits, so a
+    position missing from the log may still be filled by a running transaction.
+    The runner stops before such a gap and only moves past it once every
+    transaction that was running when it first saw the gap has ended.
+    """
+
+    def __init__(
+            self,
+            projection: Projection,
+            session_maker=None,
+            batch_size: int = APP_SETTINGS.DATABASE.PROJECTION_BATCH_SIZE,
+            poll_interval_ms: float = APP_SETTINGS.DATABASE.PROJECTION_POLL_INTERVAL_MS,
+    ):
+        self.projection = projection
+        self.session_maker = session_maker or DB_HELPER.session_dependency(db_name="primary")
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval_ms / 1000
+        self._events = PROJECTION_EVENTS.labels(projection=projection.name)
+        self._rate = PROJECTION_EVENTS_PER_SECOND.labels(projection=projection.name)
+        self._lag_events = PROJECTION_LAG_EVENTS.labels(projection=projection.name)
+        self._lag_seconds = PROJECTION_LAG_SECONDS.labels(projection=projection.name)
+        # first missing position and the next transaction id when it was seen
+        self._gap: tuple[int, int] | None = None
+        self._task: asyncio.Task | None = None
+
+    def _session(self):
+        return asynccontextmanager(self.session_maker)()
+
+    async def _checkpoint(self, db: AsyncSession) -> ProjectionCheckpoint:
+        _stmt = (
+            select(ProjectionCheckpoint)
+            .where(ProjectionCheckpoint.name == self.projection.name)
+            .with_for_update()
+        )
+        _checkpoint = await db.scalar(_stmt)
+        if _checkpoint is None:
+            await db.execute(
+                _dialect_insert(db, ProjectionCheckpoint.__table__)
+                .values(uuid=uuid.uuid4(), name=self.projection.name, position=0)
+                .on_conflict_do_nothing(index_elements=["name"])
+            )
+            _checkpoint = await db.scalar(_stmt)
+        return _checkpoint
+
+    def _event_filter(self):
+        return StoredEvent.aggregate_type == self.projection.aggregate_type
+
+    def _before_gap(self, position: int, events: list, xmin: int | None, xmax: int | None) -> list:
+        """The leading ``events`` that no running transaction can still precede."""
+        if xmin is None:
+            # a single writer (SQLite) commits positions in order
+            return events
+        for i, _event in enumerate(events):
+            if _event.position != position + 1:
+                if self._gap is None or self._gap[0] != position + 1:
+                    self._gap = (position + 1, xmax)
+                if xmin < self._gap[1]:
+                    return events[:i]
+            position = _event.position
+        return events
+
+    async def run_once(self) -> int:
+        _started = time.perf_counter()
+        async with self._session() as db:
+            _checkpoint = await self._checkpoint(db)
+            # events of every type are read, so that only real gaps stop the runner
+            _events = list(
+                await db.execute(
+                    select(*_EVENT_COLUMNS)
+                    .where(StoredEvent.position > _checkpoint.position)
+                    .order_by(StoredEvent.position)
+                    .limit(self.batch_size)
+                )
+            )
+            _head, _now, _xmin, _xmax = (
+                await db.execute(
+                    select(func.max(StoredEvent.position), func.now(), *_snapshot_bounds(db))
+                )
+            ).one()
+            _events = self._before_gap(_checkpoint.position, _events, _xmin, _xmax)
+            _applied = [e for e in _events if e.aggregate_type == self.projection.aggregate_type]
+            if _applied:
+                await self.projection.apply(db, _applied)
+            if _events:
+                _checkpoint.position = _events[-1].position
+            await db.commit()
+        _elapsed = time.perf_counter() - _started
+        self._events.inc(len(_applied))
+        self._rate.set(len(_applied) / _elapsed if _applied else 0)
+        self._lag_events.set(max(0, (_head or 0) - _checkpoint.position))
+        if _events and len(_events) == self.batch_size:
+            self._lag_seconds.set(max(0.0, (_now - _events[-1].created_at).total_seconds()))
+        else:
+            self._lag_seconds.set(0)
+        return len(_events)
+
+    async def run(self):
+        while True:
+            try:
+                _applied = await self.run_once()
+            except Exception as e:
+                print(e)
+                _applied = 0
+            if _applied < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    @staticmethod
+    def _partition_bounds(partitions: int) -> list[tuple[uuid.UUID | None, uuid.UUID | None]]:
+        # uuid4 aggregate ids are uniformly random, so equal uuid ranges act as hash
+        # partitions while still letting every partition walk the aggregate index
+        _edges = [uuid.UUID(int=i * (1 << 128) // partitions) for i in range(1, partitions)]
+        return list(zip([None, *_edges], [*_edges, None]))
+
+    def _key_name(self, item) -> str | None:
+        """Name of an index or key of the projection's table, as Postgres gives it."""
+        if isinstance(item.name, str):
+            return item.name
+        _table = self.projection.table.name
+        if isinstance(item, PrimaryKeyConstraint):
+            return f"{_table}_pkey"
+        if isinstance(item, UniqueConstraint):
+            return f"{_table}_{'_'.join(item.columns.keys())}_key"
+        return None
+
+    def _keys(self, table: Table) -> list:
+        # index and key names are per schema, unlike those of other constraints
+        _keys = (PrimaryKeyConstraint, UniqueConstraint)
+        _items = [*table.indexes, *(c for c in table.constraints if isinstance(c, _keys))]
+        return [_item for _item in _items if self._key_name(_item) is not None]
+
+    def _shadow_table(self, suffix: str) -> Table:
+        _live = self.projection.table
+        _table = _live.to_metadata(MetaData(), name=f"{_live.name}_{suffix}")
+        for _item in self._keys(_table):
+            _item.name = f"{self._key_name(_item)}_{suffix}"
+        return _table
+
+    async def _rename_keys(
+            self, db: AsyncSession, table_name: str, old_suffix: str, new_suffix: str
+    ):
+        _quote = db.bind.dialect.identifier_preparer.quote
+        for _item in self._keys(self.projection.table):
+            _name = self._key_name(_item)
+            _old, _new = _quote(f"{_name}{old_suffix}"), _quote(f"{_name}{new_suffix}")
+            if isinstance(_item, Index):
+                await db.execute(text(f"ALTER INDEX {_old} RENAME TO {_new}"))
+            else:
+                await db.execute(
+                    text(f"ALTER TABLE {_quote(table_name)} RENAME CONSTRAINT {_old} TO {_new}")
+                )
+
+    async def _swap_keys(self, db: AsyncSession, old_name: str, suffix: str):
+        """Move the index and key names of the replaced table over to the rebuilt one."""
+        if db.bind.dialect.name == "postgresql":
+            await self._rename_keys(db, old_name, "", f"_{suffix}_old")
+            await self._rename_keys(db, self.projection.table.name, f"_{suffix}", "")
+            return
+        # SQLite cannot rename indexes: the kept table loses its own, the new one's are recreated
+        _quote = db.bind.dialect.identifier_preparer.quote
+        for _index in self.projection.table.indexes:
+            await db.execute(text(f"DROP INDEX {_quote(_index.name)}"))
+            await db.execute(text(f"DROP INDEX {_quote(f'{_index.name}_{suffix}')}"))
+            await db.run_sync(lambda session, index=_index: index.create(session.connection()))
+
+    async def _refuse_unaccounted_rows(self, db: AsyncSession, table_name: str):
+        _key = column(self.projection.key)
+        _unaccounted = await db.scalar(
+            select(func.count())
+            .select_from(table(table_name, _key))
+            .where(~exists().where(self._event_filter(), StoredEvent.aggregate_id == _key))
+        )
+        if _unaccounted:
+            raise ConflictError(
+                message=f"{_unaccounted} rows of {self.projection.table.name} have no events; "
+                        "a rebuild would drop them"
+            )
+
+    async def _wait_for_transactions(self, xmax: int | None):
+        """Wait until every transaction older than ``xmax`` has ended."""
+        while xmax is not None:
+            async with self._session() as db:
+                _xmin, _ = (await db.execute(select(*_snapshot_bounds(db)))).one()
+            if _xmin >= xmax:
+                return
+            await asyncio.sleep(self.poll_interval)
+
+    async def _rebuild_partition(self, table: Table, head: int, lower, upper) -> int:
+        _applied = 0
+        _after = None
+        while True:
+            _conditions = [self._event_filter(), StoredEvent.position <= head]
+            if lower is not None:
+                _conditions.append(StoredEvent.aggregate_id >= lower)
+            if upper is not None:
+                _conditions.append(StoredEvent.aggregate_id < upper)
+            if _after is not None:
+                _conditions.append(
+                    or_(
+                        StoredEvent.aggregate_id > _after[0],
+                        and_(StoredEvent.aggregate_id == _after[0], StoredEvent.version > _after[1]),
+                    )
+                )
+            async with self._session() as db:
+                _events = list(
+                    await db.execute(
+                        select(*_EVENT_COLUMNS)
+                        .where(*_conditions)
+                        .order_by(StoredEvent.aggregate_id, StoredEvent.version)
+                        .limit(self.batch_size)
+                    )
+                )
+                if not _events:
+                    return _applied
+                await self.projection.apply(db, _events, table=table)
+                await db.commit()
+            _applied += len(_events)
+            _after = (_events[-1].aggregate_id, _events[-1].version)
+
+    async def rebuild(
+            self, partitions: int = APP_SETTINGS.DATABASE.PROJECTION_REBUILD_PARTITIONS
+    ) -> int:
+        """Replay the log into a new table and swap it in for the projection's table.
+
+        Events up to the current head are replayed by ``partitions`` concurrent
+        workers, once the transactions that may still write below it have ended.
+        The swap and the checkpoint reset to that head happen in one transaction,
+        and whatever was appended during the rebuild is applied by the regular
+        runner afterwards. The replaced table is kept as ``<table>_rebuild_<id>_old``.
+
+        The new table holds only what the events account for, so a table with
+        rows that no event accounts for is not rebuilt: ``ConflictError`` is
+        raised, before the replay and again under the swap's lock.
+        """
+        _started = time.perf_counter()
+        _suffix = f"rebuild_{uuid.uuid4().hex[:8]}"
+        _shadow = self._shadow_table(_suffix)
+        async with self._session() as db:
+            await self._refuse_unaccounted_rows(db, self.projection.table.name)
+            _head, _, _xmax = (
+                await db.execute(select(func.max(StoredEvent.position), *_snapshot_bounds(db)))
+            ).one()
+            _head = _head or 0
+            await db.run_sync(lambda session: _shadow.create(session.connection()))
+            await db.commit()
+        await self._wait_for_transactions(_xmax)
+
+        _counts = await asyncio.gather(
+            *(
+                self._rebuild_partition(_shadow, _head, _lower, _upper)
+                for _lower, _upper in self._partition_bounds(partitions)
+            )
+        )
+
+        async with self._session() as db:
+            _quote = db.bind.dialect.identifier_preparer.quote
+            _live = self.projection.table.name
+            _old = f"{_live}_{_suffix}_old"
+            _checkpoint = await self._checkpoint(db)
+            await db.execute(text(f"ALTER TABLE {_quote(_live)} RENAME TO {_quote(_old)}"))
+            try:
+                await self._refuse_unaccounted_rows(db, _old)
+            except ConflictError:
+                await db.rollback()
+                await db.run_sync(lambda session: _shadow.drop(session.connection()))
+                await db.commit()
+                raise
+            await db.execute(text(f"ALTER TABLE {_quote(_shadow.name)} RENAME TO {_quote(_live)}"))
+            await self._swap_keys(db, _old, _suffix)
+            _checkpoint.position = _head
+            await db.commit()
+
+        _applied = sum(_counts)
+        _elapsed = time.perf_counter() - _started
+        print(
+            f"Rebuilt projection {self.projection.name} from {_applied} events "
+            f"in {_elapsed:.2f}s ({_applied / _elapsed if _elapsed else 0:,.0f} events/s)"
+        )
+        return _applied
@@ -0,0 +1,116 @@
+import asyncio
+import itertools
+from typing import Callable
+
+from aio_pika import DeliveryMode, ExchangeType, Message
+from aio_pika.abc import AbstractChannel, AbstractConnection, AbstractExchange
+
+from app.helpers.tracing import traced
+from app.settings import APP_SETTINGS
+
+
+class Publisher:
+    """Publishes over a pool of channels, declaring each exchange only once.
+
+    Channels are shared round robin rather than checked out, since a channel can
+    carry many concurrent publishes. With ``publisher_confirms`` every publish
+    waits for the broker's ack; batches are published with all messages in flight
+    and their confirms awaited together.
+    """
+
+    def __init__(
+            self,
+            connection: Callable[[], AbstractConnection],
+            pool_size: int = APP_SETTINGS.RABBITMQ.PUBLISHER_POOL_SIZE,
+            publisher_confirms: bool = APP_SETTINGS.RABBITMQ.PUBLISHER_CONFIRMS,
+            persistent: bool = APP_SETTINGS.RABBITMQ.PERSISTENT_MESSAGES,
+    ):
+        self._connection = connection
+        self.publisher_confirms = publisher_confirms
+        self.delivery_mode = DeliveryMode.PERSISTENT if persistent else DeliveryMode.NOT_PERSISTENT
+        self.pool_size = pool_size
+        self._channels: list[asyncio.Future | None] = [None] * pool_size
+        self._next = itertools.count()
+        self._declared: set[str] = set()
+        self._declaring: dict[str, asyncio.Task] = {}
+        self._exchanges: dict[tuple[int, str], tuple[AbstractChannel, AbstractExchange]] = {}
+
+    async def _channel(self) -> AbstractChannel:
+        _slot = next(self._next) % self.pool_size
+        _channel = self._channels[_slot]
+        if _channel is not None and _channel.done():
+            if _channel.cancelled() or _channel.exception() or _channel.result().is_closed:
+                _channel = None
+        if _channel is None:
+            _channel = self._channels[_slot] = asyncio.ensure_future(
+                self._connection().channel(publisher_confirms=self.publisher_confirms)
+            )
+        return await asyncio.shield(_channel)
+
+    async def _declare(self, channel: AbstractChannel, name: str):
+        try:
+            await channel.declare_exchange(name, ExchangeType.TOPIC, durable=True)
+            self._declared.add(name)
+        finally:
+            self._declaring.pop(name, None)
+
+    async def _exchange(self, channel: AbstractChannel, name: str) -> AbstractExchange:
+        _cached = self._exchanges.get((id(channel), name))
+        if _cached is not None and _cached[0] is channel:
+            return _cached[1]
+        if name not in self._declared:
+            # one declare round trip per exchange, shared by concurrent publishers
+            _declaring = self._declaring.get(name)
+            if _declaring is None:
+                _declaring = self._declaring[name] = asyncio.ensure_future(
+                    self._declare(channel, name)
+                )
+            await asyncio.shield(_declaring)
+        _exchange = await channel.get_exchange(name, ensure=False)
+        self._exchanges[(id(channel), name)] = (channel, _exchange)
+        return _exchange
+
+    def _message(self, body: bytes, delivery_mode: DeliveryMode | None = None, **kwargs) -> Message:
+        return Message(body, delivery_mode=delivery_mode or self.delivery_mode, **kwargs)
+
+    @traced("publisher")
+    async def publish(
+            self,
+            routing_key: str,
+            body: bytes,
+            exchange: str = APP_SETTINGS.RABBITMQ.EXCHANGE,
+            **kwargs,
+    ):
+        _channel = await self._channel()
+        _exchange = await self._exchange(_channel, exchange)
+        await _exchange.publish(self._message(body, **kwargs), routing_key)
+
+    @traced("publisher")
+    async def publish_batch(
+            self,
+            messages: list[tuple[str, bytes, dict]],
+            exchange: str = APP_SETTINGS.RABBITMQ.EXCHANGE,
+    ) -> list[BaseException | None]:
+        """Publish ``(routing_key, body, message_kwargs)`` triples on one channel.
+
+        Returns ``None`` per confirmed message, or the error it failed with.
+        """
+        _channel = await self._channel()
+        _exchange = await self._exchange(_channel, exchange)
+        _results = await asyncio.gather(
+            *(
+                _exchange.publish(self._message(body, **kwargs), routing_key)
+                for routing_key, body, kwargs in messages
+            ),
+            return_exceptions=True,
+        )
+        return [r if isinstance(r, BaseException) else None for r in _results]
+
+    async def close(self):
+        for _channel in self._channels:
+            if _channel is None or not _channel.done() or _channel.cancelled():
+                continue
+            if _channel.exception() is None:
+                await _channel.result().close()
+        self._channels = [None] * self.pool_size
+        self._exchanges.clear()
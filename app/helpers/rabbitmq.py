@@ -1,11 +1,16 @@
-import json
 from contextlib import asynccontextmanager
 from functools import partial
 
-from aio_pika import DeliveryMode, ExchangeType, IncomingMessage, Message, connect
+from aio_pika import ExchangeType, IncomingMessage, connect
+from pydantic import BaseModel
 
+from app.helpers.codecs import codec_for_exchange, decode
+from app.helpers.consumer import ConsumerEngine
 from app.helpers.db import DB_HELPER
+from app.helpers.events import EventRegistry
 from app.helpers.exceptions import RabbitMQError
+from app.helpers.outbox import OutboxRelay
+from app.helpers.publisher import Publisher
 
 from app.settings import APP_SETTINGS
 
@@ -24,6 +29,8 @@ class RabbitMQ:
         self.password = password
         self.connection = None
         self.channel = None
+        self.publisher = Publisher(lambda: self.connection)
+        self._declared_queues = set()
 
     async def connect(self):
         self.connection = await connect(
@@ -33,90 +40,65 @@ class RabbitMQ:
         self.channel = await self.connection.channel()
 
     async def declare_queue(self, queue_name):
+        if queue_name in self._declared_queues:
+            return
         await self.channel.declare_queue(queue_name, durable=True)
+        self._declared_queues.add(queue_name)
 
     async def send_message(
             self,
             routing_key: str,
-            message: dict,
+            message: dict | BaseModel,
+            exchange: str = APP_SETTINGS.RABBITMQ.EXCHANGE,
     ):
-        exchange = await self.channel.declare_exchange(
-            APP_SETTINGS.RABBITMQ.EXCHANGE, ExchangeType.TOPIC, durable=True
+        _codec = codec_for_exchange(exchange)
+        await self.publisher.publish(
+            routing_key,
+            _codec.encode(message),
+            exchange=exchange,
+            content_type=_codec.content_type,
         )
-        message = Message(
-            json.dumps(message.model_dump()).encode(),
-            delivery_mode=DeliveryMode.NOT_PERSISTENT,
-        )
-        await exchange.publish(message, routing_key)
 
     async def consume_messages(self, queue_name, callback):
         queue = await self.channel.declare_queue(queue_name, durable=True)
         return await queue.consume(callback)
 
+    async def consume_broadcast(self, routing_key, callback):
+        """Consume every message published with ``routing_key`` on a process-private queue."""
+        exchange = await self.channel.declare_exchange(
+            APP_SETTINGS.RABBITMQ.EXCHANGE, ExchangeType.TOPIC, durable=True
+        )
+        queue = await self.channel.declare_queue(exclusive=True, auto_delete=True)
+        await queue.bind(exchange, routing_key)
+        return await queue.consume(callback)
+
     async def close_connection(self):
+        await self.publisher.close()
         if self.connection and self.connection.is_open:
             await self.connection.close()
 
 
 RMQ_Client = RabbitMQ()
+OUTBOX_RELAY = OutboxRelay(RMQ_Client)
 
 
-async def producer(
-        message: dict,
-        queue_name: str = APP_SETTINGS.RABBITMQ.PUBLISH_QUEUE,
-        routing_key: str = APP_SETTINGS.RABBITMQ.ROUTING_KEY,
-):
-    await RMQ_Client.declare_queue(queue_name)
-    try:
-        await RMQ_Client.send_message(routing_key=routing_key, message=message)
-        print(f"Sent message: \n\n\t {message}")
-    except Exception as e:
-        print(e)
-        raise RabbitMQError
-
-
-def publish_event(event_name: str, queue_name: str = APP_SETTINGS.RABBITMQ.PUBLISH_QUEUE):
-    async def _wrapper(coro):
-        async def _inner_func(*args, **kwargs):
-            await coro(*args, **kwargs)
-            await producer(message={'event': event_name}, queue_name=queue_name)
-
-        return _inner_func
-
-    return _wrapper
+# handlers run once per message, by whichever process consumes it from the shared queue
+event = EventRegistry("event")
+# handlers run in every process, e.g. to keep in-process caches up to date
+broadcast_event = EventRegistry("broadcast")
 
 
-class EventRegister:
-    def __init__(self):
-        self._events = {}
-
-    def on(self, event_name):
-        def wrapper(func):
-            def _wrapper(*args, **kwargs):
-                self._events[event_name] = func
-                return func
-
-            return _wrapper
-
-        return wrapper
-
-    @property
-    def events(self):
-        return self._events
-
-
-event = EventRegister()
-
-
-async def handle_payload(message: IncomingMessage, session_maker, queue_name: str):
+async def handle_payload(
+        message: IncomingMessage,
+        session_maker,
+        queue_name: str,
+        register: EventRegistry = event,
+):
     async with message.process():
-        _payload_str = message.body.decode()
-        _payload = json.loads(_payload_str)
-        _event = _payload.get('event')
-        _handler = event.events.get(_event)
+        _payload = decode(message.body, message.content_type)
         try:
             async with asynccontextmanager(session_maker)() as db:
-                await _handler(db, **_payload)
+                await register.dispatch(db, [_payload])
         except Exception as e:
             print(e)
             raise RabbitMQError
@@ -127,8 +109,26 @@ async def handle_payload(message: IncomingMessage, session_maker, queue_name: st
         }
 
 
-async def consumer(queue_name: str = APP_SETTINGS.RABBITMQ.CONSUME_QUEUE):
+async def consumer(
+        queue_name: str = APP_SETTINGS.RABBITMQ.CONSUME_QUEUE,
+        routing_keys: list[str] | None = None,
+) -> ConsumerEngine:
+    _engine = ConsumerEngine(
+        connection=lambda: RMQ_Client.connection,
+        queue_name=queue_name,
+        register=event,
+        session_maker=DB_HELPER.session_dependency(),
+        routing_keys=routing_keys,
+    )
+    await _engine.start()
+    return _engine
+
+
+async def broadcast_consumer(routing_key: str = APP_SETTINGS.RABBITMQ.ROUTING_KEY):
     _handle = partial(
-        handle_payload, session_maker=DB_HELPER.session_dependency, queue_name=queue_name
+        handle_payload,
+        session_maker=DB_HELPER.session_dependency(),
+        queue_name=routing_key,
+        register=broadcast_event,
     )
-    await RMQ_Client.consume_messages(queue_name, _handle)
+    await RMQ_Client.consume_broadcast(routing_key, _handle)
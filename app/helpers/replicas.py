@@ -0,0 +1,208 @@
+import asyncio
+import itertools
+import random
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.helpers.metrics import DB_REPLICA_HEALTHY, DB_REPLICA_LAG_BYTES
+
+
+def lsn_to_int(lsn: str) -> int:
+    """Convert a textual WAL position such as ``16/B374D848`` into a comparable int."""
+    _high, _low = lsn.split("/")
+    return (int(_high, 16) << 32) + int(_low, 16)
+
+
+@dataclass
+class Replica:
+    name: str
+    engine: AsyncEngine
+    healthy: bool = True
+    failures: int = 0
+    outstanding: int = 0
+    # exponentially weighted health check round trip, in seconds
+    latency: float | None = None
+    replay_lsn: int | None = None
+    replay_lsn_at: float = 0.0
+
+    @property
+    def is_postgres(self) -> bool:
+        return self.engine.dialect.name == "postgresql"
+
+
+class Balancer(ABC):
+    @abstractmethod
+    def choose(self, replicas: list[Replica]) -> Replica:
+        ...
+
+
+class RoundRobinBalancer(Balancer):
+    def __init__(self):
+        self._counter = itertools.count()
+
+    def choose(self, replicas: list[Replica]) -> Replica:
+        return replicas[next(self._counter) % len(replicas)]
+
+
+class LeastOutstandingBalancer(Balancer):
+    def choose(self, replicas: list[Replica]) -> Replica:
+        return min(replicas, key=lambda r: r.outstanding)
+
+
+class LatencyWeightedBalancer(Balancer):
+    """Picks replicas at random, weighted by the inverse of their measured latency."""
+
+    def choose(self, replicas: list[Replica]) -> Replica:
+        _weights = [1 / max(r.latency or 0.001, 0.0001) for r in replicas]
+        return random.choices(replicas, weights=_weights)[0]
+
+
+BALANCERS = {
+    "round_robin": RoundRobinBalancer,
+    "least_outstanding": LeastOutstandingBalancer,
+    "latency_weighted": LatencyWeightedBalancer,
+}
+
+
+class ReplicaPool:
+    """Named read replicas with load balancing and health-based ejection.
+
+    A background check measures every replica's round trip and replay position.
+    A replica that fails ``failure_threshold`` checks in a row, or falls more than
+    ``max_lag_bytes`` behind the primary, is ejected. It is re-admitted on its
+    first healthy check.
+    """
+
+    def __init__(
+            self,
+            replicas: dict[str, AsyncEngine],
+            primary: AsyncEngine,
+            balancer: Balancer,
+            check_interval: float = 2,
+            max_lag_bytes: int = 16 * 1024 * 1024,
+            failure_threshold: int = 2,
+    ):
+        self.replicas = {name: Replica(name=name, engine=engine) for name, engine in replicas.items()}
+        self.primary = primary
+        self.balancer = balancer
+        self.check_interval = check_interval
+        self.max_lag_bytes = max_lag_bytes
+        self.failure_threshold = failure_threshold
+        self.primary_lsn = 0
+        self._polls: dict[str, asyncio.Task] = {}
+        self._checker: asyncio.Task | None = None
+        for _replica in self.replicas.values():
+            DB_REPLICA_HEALTHY.labels(replica=_replica.name).set(1)
+
+    def healthy(self) -> list[Replica]:
+        return [r for r in self.replicas.values() if r.healthy]
+
+    def choose(self, min_lsn: int | None = None) -> Replica | None:
+        _candidates = self.healthy()
+        if min_lsn is not None:
+            _candidates = [
+                r for r in _candidates if r.replay_lsn is not None and r.replay_lsn >= min_lsn
+            ]
+        if not _candidates:
+            return None
+        return self.balancer.choose(_candidates)
+
+    def observe_primary_lsn(self, lsn: int):
+        self.primary_lsn = max(self.primary_lsn, lsn)
+
+    async def _poll_replay_lsn(self, replica: Replica) -> int | None:
+        async with replica.engine.connect() as conn:
+            _lsn = await conn.scalar(
+                text("SELECT COALESCE(pg_last_wal_replay_lsn(), pg_current_wal_lsn())")
+            )
+        replica.replay_lsn = lsn_to_int(str(_lsn))
+        replica.replay_lsn_at = time.monotonic()
+        DB_REPLICA_LAG_BYTES.labels(replica=replica.name).set(
+            max(0, self.primary_lsn - replica.replay_lsn)
+        )
+        return replica.replay_lsn
+
+    async def replay_lsn(self, replica: Replica, max_age: float = 0) -> int | None:
+        if (
+                replica.replay_lsn is not None
+                and time.monotonic() - replica.replay_lsn_at <= max_age
+        ):
+            return replica.replay_lsn
+        # concurrent readers share one round trip per replica
+        _poll = self._polls.get(replica.name)
+        if _poll is None or _poll.done():
+            _poll = self._polls[replica.name] = asyncio.ensure_future(
+                self._poll_replay_lsn(replica)
+            )
+        return await asyncio.shield(_poll)
+
+    async def refresh_replay_lsns(self, max_age: float = 0):
+        _replicas = [r for r in self.healthy() if r.is_postgres]
+        await asyncio.gather(
+            *(self.replay_lsn(r, max_age=max_age) for r in _replicas), return_exceptions=True
+        )
+
+    async def _check(self, replica: Replica):
+        _started = time.monotonic()
+        try:
+            if replica.is_postgres:
+                await self._poll_replay_lsn(replica)
+            else:
+                async with replica.engine.connect() as conn:
+                    await conn.scalar(text("SELECT 1"))
+        except Exception as e:
+            replica.failures += 1
+            if replica.healthy and replica.failures >= self.failure_threshold:
+                print(f"Replica {replica.name} ejected: {e}")
+                replica.healthy = False
+        else:
+            _elapsed = time.monotonic() - _started
+            replica.latency = (
+                _elapsed if replica.latency is None else 0.8 * replica.latency + 0.2 * _elapsed
+            )
+            replica.failures = 0
+            _lagging = (
+                replica.replay_lsn is not None
+                and self.primary_lsn - replica.replay_lsn > self.max_lag_bytes
+            )
+            if replica.healthy and _lagging:
+                print(f"Replica {replica.name} ejected: lagging behind primary")
+            elif not replica.healthy and not _lagging:
+                print(f"Replica {replica.name} re-admitted")
+            replica.healthy = not _lagging
+        DB_REPLICA_HEALTHY.labels(replica=replica.name).set(int(replica.healthy))
+
+    async def _check_primary(self):
+        if self.primary.dialect.name != "postgresql":
+            return
+        try:
+            async with self.primary.connect() as conn:
+                _lsn = await conn.scalar(text("SELECT pg_current_wal_lsn()"))
+        except Exception as e:
+            print(f"Primary WAL position check failed: {e}")
+            return
+        self.observe_primary_lsn(lsn_to_int(str(_lsn)))
+
+    async def _run_checks(self):
+        while True:
+            await self._check_primary()
+            await asyncio.gather(*(self._check(r) for r in self.replicas.values()))
+            await asyncio.sleep(self.check_interval)
+
+    def start(self):
+        if self._checker is None or self._checker.done():
+            self._checker = asyncio.create_task(self._run_checks())
+
+    async def stop(self):
+        if self._checker is None:
+            return
+        self._checker.cancel()
+        try:
+            await self._checker
+        except asyncio.CancelledError:
+            pass
+        self._checker = None
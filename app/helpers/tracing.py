@@ -0,0 +1,151 @@
+"""Per-request stage timings for the hot path.
+
+A sampled request carries a ``Trace`` in a context variable. Code decorated with
+``traced`` (or run under ``span``) records its duration into the trace and
+into the ``app_stage_seconds`` histogram, labelled by layer and operation.
+Outside a sampled request a span costs one context variable lookup.
+
+Durations are inclusive: a service span contains the handler and repository
+spans made inside it.
+"""
+import inspect
+import random
+import time
+from contextvars import ContextVar
+from functools import wraps
+from typing import Callable
+
+from app.helpers.metrics import STAGE_SECONDS
+from app.settings import APP_SETTINGS
+
+
+class Trace:
+    __slots__ = ("started", "spans", "closed")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: list[tuple[str, float]] = []
+        # background tasks started during the request inherit the trace; once the
+        # request is over they still feed the histograms but no longer the trace
+        self.closed = False
+
+    def record(self, name: str, histogram, seconds: float):
+        histogram.observe(seconds)
+        if not self.closed:
+            self.spans.append((name, seconds))
+
+    def server_timing(self) -> str:
+        _totals: dict[str, float] = {}
+        for _name, _seconds in self.spans:
+            _totals[_name] = _totals.get(_name, 0) + _seconds
+        _totals["app"] = time.perf_counter() - self.started
+        return ", ".join(f"{_name};dur={_seconds * 1000:.3f}" for _name, _seconds in _totals.items())
+
+
+TRACE: ContextVar[Trace | None] = ContextVar("trace", default=None)
+
+
+def start_trace() -> Trace | None:
+    """A new ``Trace`` for ``TRACING_SAMPLE_RATE`` of the calls, ``None`` for the rest."""
+    _settings = APP_SETTINGS.TRACING
+    if not _settings.ENABLED or random.random() >= _settings.SAMPLE_RATE:
+        return None
+    return Trace()
+
+
+class _Span:
+    __slots__ = ("trace", "name", "histogram", "started")
+
+    def __init__(self, trace: Trace, name: str, histogram):
+        self.trace = trace
+        self.name = name
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.record(self.name, self.histogram, time.perf_counter() - self.started)
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+_STAGES: dict[tuple[str, str], tuple[str, object]] = {}
+
+
+def _stage(layer: str, operation: str) -> tuple[str, object]:
+    _key = (layer, operation)
+    _entry = _STAGES.get(_key)
+    if _entry is None:
+        _entry = _STAGES[_key] = (f"{layer}.{operation}", STAGE_SECONDS.labels(layer, operation))
+    return _entry
+
+
+def span(layer: str, operation: str):
+    """Time a block: ``with span("session", "acquire"): ...``."""
+    _trace = TRACE.get()
+    if _trace is None:
+        return _NO_SPAN
+    return _Span(_trace, *_stage(layer, operation))
+
+
+def traced(layer: str, operation: str | None = None) -> Callable:
+    """Time every call of the decorated function as ``layer.operation``."""
+
+    def decorator(func):
+        _name, _histogram = _stage(layer, operation or func.__name__)
+
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def _async_wrapper(*args, **kwargs):
+                _trace = TRACE.get()
+                if _trace is None:
+                    return await func(*args, **kwargs)
+                _started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    _trace.record(_name, _histogram, time.perf_counter() - _started)
+
+            return _async_wrapper
+
+        @wraps(func)
+        def _wrapper(*args, **kwargs):
+            _trace = TRACE.get()
+            if _trace is None:
+                return func(*args, **kwargs)
+            _started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _trace.record(_name, _histogram, time.perf_counter() - _started)
+
+        return _wrapper
+
+    return decorator
+
+
+def traced_class(layer: str) -> Callable:
+    """Apply ``traced(layer)`` to the public async static methods of a class."""
+
+    def decorator(cls):
+        for _attr, _value in list(vars(cls).items()):
+            if (
+                    isinstance(_value, staticmethod)
+                    and not _attr.startswith("_")
+                    and inspect.iscoroutinefunction(_value.__func__)
+            ):
+                setattr(cls, _attr, staticmethod(traced(layer, f"{cls.__name__}.{_attr}")(_value.__func__)))
+        return cls
+
+    return decorator
@@ -8,11 +8,28 @@ from fastapi.exceptions import RequestValidationError
 from prometheus_fastapi_instrumentator import Instrumentator
 from starlette.middleware.cors import CORSMiddleware
 
+from app.api_v1.admin_router.router import admin_router
+from app.api_v1.user_router.router import user_router
+from app.api_v1.user_router.services.command import USER_CREATE_BUS
+from app.helpers.cryptography import PASSWORD_HASHER
 from app.helpers.db import DB_HELPER
 from app.helpers.exceptions import NotFound, ServiceException, ValidationError
-from app.helpers.rabbitmq import RMQ_Client, consumer
+from app.helpers.http_client import HTTP_CLIENTS
+from app.helpers.middlewares import (
+    CONSISTENCY_HEADER,
+    SERVER_TIMING_HEADER,
+    ConsistencyMiddleware,
+    TracingMiddleware,
+)
+from app.helpers.rabbitmq import (
+    OUTBOX_RELAY,
+    RMQ_Client,
+    broadcast_consumer,
+    consumer,
+    event,
+)
 from app.helpers.response import Response
-from app.api_v1.user_router.router import user_router
+from app.settings import APP_SETTINGS
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -21,12 +38,26 @@ logger.addHandler(logging.StreamHandler(sys.stdout))
 
 @asynccontextmanager
 async def lifespan(f_app: FastAPI):
-    async with asynccontextmanager(DB_HELPER.scoped_session_dependency)() as _:
+    async with asynccontextmanager(DB_HELPER.scoped_session_dependency())() as _:
         print("DB Connected")
+    DB_HELPER.replicas.start()
     await RMQ_Client.connect()
-    await consumer()
+    _consumer = None
+    # without handlers on ``event`` the consumer would only take messages to drop them
+    if APP_SETTINGS.RABBITMQ.CONSUMER_ENABLED and event.routes:
+        _consumer = await consumer()
+    await broadcast_consumer()
     print("RabbitMQ Connected")
+    if APP_SETTINGS.RABBITMQ.OUTBOX_RELAY_ENABLED:
+        OUTBOX_RELAY.start()
     yield
+    await OUTBOX_RELAY.stop()
+    if _consumer is not None:
+        await _consumer.stop()
+    await USER_CREATE_BUS.close()
+    await DB_HELPER.replicas.stop()
+    await HTTP_CLIENTS.close()
+    PASSWORD_HASHER.shutdown()
 
 
 app = FastAPI(
@@ -36,6 +67,7 @@ app = FastAPI(
 )
 
 app.include_router(user_router)
+app.include_router(admin_router)
 Instrumentator().instrument(app).expose(app)
 origins: set = {
     "*",
@@ -49,7 +81,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[CONSISTENCY_HEADER, SERVER_TIMING_HEADER],
 )
+app.add_middleware(ConsistencyMiddleware)
+app.add_middleware(TracingMiddleware)
 
 uvloop.install()
 
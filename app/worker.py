@@ -0,0 +1,185 @@
+"""Standalone event consumer, run apart from the API processes.
+
+    python -m app.worker --processes 4
+
+Every process connects on its own and consumes with the registered ``event``
+handlers. Without routing keys all processes share ``CONSUME_QUEUE`` as
+competing consumers. With ``--routing-keys`` (or ``RABBIT_MQ_WORKER_ROUTING_KEYS``)
+each key is hashed to one shard, and shard ``i`` consumes its own
+``<CONSUME_QUEUE>.shard-<i>`` queue bound to just those keys, so the events of a
+routing key are always handled by the same process.
+
+Set ``RABBIT_MQ_CONSUMER_ENABLED=false`` on the API to leave consumption to the
+workers. Nothing is consumed while no handler is registered on ``event``; a
+worker with nothing else to do then exits.
+
+``--with-projections`` also keeps the read-side projections up to date from the
+event store, and ``--rebuild-projection user`` replays one from scratch and exits.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import signal
+import zlib
+
+import uvloop
+
+from app.settings import APP_SETTINGS
+
+
+def shard_for(routing_key: str, shards: int) -> int:
+    return zlib.crc32(routing_key.encode()) % shards
+
+
+def shard_routing_keys(routing_keys: list[str], shards: int) -> list[list[str]]:
+    _shards = [[] for _ in range(shards)]
+    for _routing_key in routing_keys:
+        _shards[shard_for(_routing_key, shards)].append(_routing_key)
+    return _shards
+
+
+def shard_queue(shard: int) -> str:
+    return f"{APP_SETTINGS.RABBITMQ.CONSUME_QUEUE}.shard-{shard}"
+
+
+def _projections() -> dict:
+    from app.api_v1.user_router.repository.projection import USER_PROJECTION
+
+    return {_projection.name: _projection for _projection in (USER_PROJECTION,)}
+
+
+async def _rebuild(name: str, partitions: int):
+    from app.helpers.projections import ProjectionRunner
+
+    await ProjectionRunner(_projections()[name]).rebuild(partitions)
+
+
+async def _run(
+        shard: int,
+        routing_keys: list[str] | None,
+        with_outbox_relay: bool,
+        with_projections: bool,
+):
+    # imported here so that every process builds its own engines and connections
+    import app.api_v1.user_router.router  # noqa: F401 registers the event handlers
+    from app.helpers.db import DB_HELPER
+    from app.helpers.projections import ProjectionRunner
+    from app.helpers.rabbitmq import OUTBOX_RELAY, RMQ_Client, consumer, event
+
+    if not (event.routes or with_outbox_relay or with_projections):
+        print(f"Worker {shard} has no event handlers, outbox relay or projections to run")
+        return
+
+    _stop = asyncio.Event()
+    _loop = asyncio.get_running_loop()
+    for _signal in (signal.SIGINT, signal.SIGTERM):
+        _loop.add_signal_handler(_signal, _stop.set)
+
+    DB_HELPER.replicas.start()
+    await RMQ_Client.connect()
+    if not event.routes:
+        _consumer = None
+    elif routing_keys is None:
+        _consumer = await consumer()
+    else:
+        _consumer = await consumer(shard_queue(shard), routing_keys=routing_keys)
+    if with_outbox_relay:
+        OUTBOX_RELAY.start()
+    # runners of one projection take turns on its checkpoint, so every shard can run them
+    _runners = [ProjectionRunner(p) for p in _projections().values()] if with_projections else []
+    for _runner in _runners:
+        _runner.start()
+    if _consumer is not None:
+        print(f"Worker {shard} consuming {_consumer.queue_name} {routing_keys or ''}".rstrip())
+
+    await _stop.wait()
+
+    for _runner in _runners:
+        await _runner.stop()
+    await OUTBOX_RELAY.stop()
+    if _consumer is not None:
+        await _consumer.stop()
+    await RMQ_Client.close_connection()
+    await DB_HELPER.replicas.stop()
+    print(f"Worker {shard} stopped")
+
+
+def run_worker(
+        shard: int,
+        routing_keys: list[str] | None,
+        with_outbox_relay: bool = False,
+        with_projections: bool = False,
+):
+    uvloop.install()
+    asyncio.run(_run(shard, routing_keys, with_outbox_relay, with_projections))
+
+
+def main(args):
+    if args.rebuild_projection:
+        uvloop.install()
+        asyncio.run(_rebuild(args.rebuild_projection, args.partitions))
+        return
+
+    _processes = max(1, args.processes)
+    _routing_keys = args.routing_keys or APP_SETTINGS.RABBITMQ.WORKER_ROUTING_KEYS
+    _shards = shard_routing_keys(_routing_keys, _processes) if _routing_keys else None
+    if _shards is not None and not all(_shards):
+        print("Some worker shards have no routing keys; consider fewer processes or more keys")
+
+    if _processes == 1:
+        run_worker(0, _shards[0] if _shards else None, args.with_outbox_relay, args.with_projections)
+        return
+
+    _context = multiprocessing.get_context("spawn")
+    _workers = [
+        _context.Process(
+            target=run_worker,
+            args=(i, _shards[i] if _shards else None, args.with_outbox_relay, args.with_projections),
+            name=f"worker-{i}",
+        )
+        for i in range(_processes)
+    ]
+    for _worker in _workers:
+        _worker.start()
+
+    def _terminate(*_):
+        for _worker in _workers:
+            if _worker.is_alive():
+                _worker.terminate()
+
+    signal.signal(signal.SIGTERM, _terminate)
+    try:
+        for _worker in _workers:
+            _worker.join()
+    except KeyboardInterrupt:
+        # children got the SIGINT too and shut down on their own
+        for _worker in _workers:
+            _worker.join()
+
+
+if __name__ == "__main__":
+    _parser = argparse.ArgumentParser(description="Run the event consumers")
+    _parser.add_argument(
+        "--processes", type=int, default=APP_SETTINGS.RABBITMQ.WORKER_PROCESSES
+    )
+    _parser.add_argument(
+        "--routing-keys", nargs="*", default=None,
+        help="routing keys to shard across the processes",
+    )
+    _parser.add_argument(
+        "--with-outbox-relay", action="store_true",
+        help="also relay outbox messages from these processes",
+    )
+    _parser.add_argument(
+        "--with-projections", action="store_true",
+        help="also apply new events to the read-side projections",
+    )
+    _parser.add_argument(
+        "--rebuild-projection", default=None,
+        help="replay the named projection from the event store, swap it in and exit",
+    )
+    _parser.add_argument(
+        "--partitions", type=int, default=APP_SETTINGS.DATABASE.PROJECTION_REBUILD_PARTITIONS,
+        help="parallel partitions for --rebuild-projection",
+    )
+    main(_parser.parse_args())
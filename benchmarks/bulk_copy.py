@@ -0,0 +1,64 @@
+"""Throughput of the COPY-based user import and export.
+
+Writes a CSV of ``--rows`` users, then imports and exports it through
+``UserBulkService`` against the configured Postgres (``WALLE_DATABASE_URL``).
+With ``--validate-only`` it only measures reading and batch validation, which
+needs no database.
+
+    python -m benchmarks.bulk_copy --rows 1000000
+    python -m benchmarks.bulk_copy --rows 1000000 --validate-only
+"""
+import argparse
+import asyncio
+import csv
+import os
+import tempfile
+import time
+
+from app.api_v1.user_router.services.bulk import UserBulkService
+
+
+def _write_csv(path: str, rows: int):
+    with open(path, "w", newline="") as _file:
+        _writer = csv.writer(_file)
+        _writer.writerow(["name", "email", "phone"])
+        _writer.writerows(
+            (f"user {i}", f"user{i}@example.com", f"+374{i:08d}") for i in range(rows)
+        )
+
+
+def _validate_only(path: str, chunk_size: int) -> dict:
+    _started = time.perf_counter()
+    _valid = 0
+    with open(path, newline="") as _file:
+        _reader = csv.DictReader(_file)
+        while True:
+            _rows, _users, _ = UserBulkService._read_chunk(_reader, chunk_size, 2)
+            if not _rows:
+                break
+            _valid += len(_users)
+    _elapsed = time.perf_counter() - _started
+    return {"validated": _valid, "seconds": _elapsed, "rows_per_second": _valid / _elapsed}
+
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as _dir:
+        _source = os.path.join(_dir, "users.csv")
+        _write_csv(_source, args.rows)
+        print(f"{args.rows:,} rows, {os.path.getsize(_source) / 1e6:.1f} MB")
+        if args.validate_only:
+            print("read + validate", _validate_only(_source, args.chunk_size))
+            return
+        _result = await UserBulkService.import_users(_source, args.chunk_size)
+        _result.pop("errors")
+        print("import", _result)
+        _export = await UserBulkService.export_users(os.path.join(_dir, "export.csv"))
+        print("export", {**_export, "rows_per_second": args.rows / _export["seconds"]})
+
+
+if __name__ == "__main__":
+    _parser = argparse.ArgumentParser()
+    _parser.add_argument("--rows", type=int, default=1_000_000)
+    _parser.add_argument("--chunk-size", type=int, default=10_000)
+    _parser.add_argument("--validate-only", action="store_true")
+    asyncio.run(main(_parser.parse_args()))
@@ -0,0 +1,69 @@
+"""Encode/decode cost and payload size of the message codecs for user events.
+
+The stdlib baseline is the previous path: ``json.dumps(model.model_dump(mode="json"))``.
+
+    python -m benchmarks.codecs --users 1 10 100 --rounds 2000
+"""
+import argparse
+import datetime
+import json
+import time
+import uuid
+
+from app.api_v1.user_router.schemas.event_schema import UserEvent, UserEventUser
+from app.helpers.codecs import CODECS
+
+
+def _event(users: int) -> UserEvent:
+    return UserEvent(
+        users=[
+            UserEventUser(
+                uuid=uuid.uuid4(),
+                name=f"user {i}",
+                email=f"user{i}@example.com",
+                phone="+37400000000",
+                created_at=datetime.datetime.now(datetime.timezone.utc),
+            )
+            for i in range(users)
+        ]
+    )
+
+
+def _time(func, rounds: int) -> float:
+    _started = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - _started) / rounds * 1e6
+
+
+def main(args):
+    print(f"{'users':>6}{'codec':>22}{'encode us':>12}{'decode us':>12}{'bytes':>10}")
+    for _users in args.users:
+        _model = _event(_users)
+        _baseline = json.dumps(_model.model_dump(mode="json")).encode()
+        _cases = {
+            "stdlib json (dict)": (
+                lambda: json.dumps(_model.model_dump(mode="json")).encode(),
+                lambda: json.loads(_baseline),
+                _baseline,
+            )
+        }
+        for _name, _codec in CODECS.items():
+            _body = _codec.encode(_model)
+            _cases[_name] = (
+                lambda c=_codec: c.encode(_model),
+                lambda c=_codec, b=_body: c.decode(b),
+                _body,
+            )
+        for _name, (_encode, _decode, _body) in _cases.items():
+            print(
+                f"{_users:>6}{_name:>22}{_time(_encode, args.rounds):>12.2f}"
+                f"{_time(_decode, args.rounds):>12.2f}{len(_body):>10,}"
+            )
+
+
+if __name__ == "__main__":
+    _parser = argparse.ArgumentParser()
+    _parser.add_argument("--users", type=int, nargs="*", default=[1, 10, 100])
+    _parser.add_argument("--rounds", type=int, default=2000)
+    main(_parser.parse_args())
@@ -0,0 +1,364 @@
+"""End-to-end throughput and latency of the user command and query paths.
+
+Runs the FastAPI app in-process over httpx's ASGI transport, against a SQLite
+file through aiosqlite (or a local Postgres given with ``--dsn``), with
+RabbitMQ replaced by the in-memory broker of ``benchmarks.stubs``.
+``--concurrency`` clients send ``--requests`` requests per scenario:
+
+- ``create_user``: ``POST /user/user``, with the outbox relay publishing meanwhile
+- ``get_user``: ``GET /user/user`` over ``--users`` seeded users
+
+Besides request latency, every scenario reports the per-request time spent in
+each stage:
+
+- ``session``: waiting for a pooled connection
+- ``query``: executing statements
+- ``serialization``: validating and rendering the response
+
+``publish`` is reported per outbox relay batch.
+
+Results can be saved as a JSON baseline and compared with a later run. The
+comparison exits with status 1 when throughput or a p50/p99 regressed by more
+than ``--threshold`` percent.
+
+    python -m benchmarks.e2e --requests 2000 --concurrency 50 --save baseline.json
+    python -m benchmarks.e2e --requests 2000 --concurrency 50 --compare baseline.json
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from contextvars import ContextVar
+
+import fastapi.routing
+import httpx
+from sqlalchemy import event, insert
+from sqlalchemy.ext.asyncio import (
+    async_scoped_session,
+    async_sessionmaker,
+    create_async_engine,
+)
+from starlette.responses import JSONResponse
+
+from app.api_v1.user_router.repository.models import User
+from app.helpers.db import DB_HELPER, BaseModel, InstrumentedAsyncQueuePool
+from app.helpers.rabbitmq import OUTBOX_RELAY, RMQ_Client
+from app.main import app
+from app.settings import APP_SETTINGS
+from benchmarks.stubs import InMemoryBroker
+
+# stage durations of the request being driven; hooks add to it, the driver reads it
+_REQUEST_STAGES: ContextVar[dict | None] = ContextVar("request_stages", default=None)
+_PUBLISH_SAMPLES: list[float] = []
+
+
+def _add_stage(stage: str, seconds: float):
+    _stages = _REQUEST_STAGES.get()
+    if _stages is not None:
+        _stages[stage] += seconds
+
+
+class _TimedPool(InstrumentedAsyncQueuePool):
+    def connect(self):
+        _started = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            _add_stage("session", time.perf_counter() - _started)
+
+
+def _install_hooks(engine):
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("bench_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        _add_stage("query", time.perf_counter() - conn.info["bench_started"].pop())
+
+    _serialize_response = fastapi.routing.serialize_response
+
+    async def _timed_serialize_response(*args, **kwargs):
+        _started = time.perf_counter()
+        try:
+            return await _serialize_response(*args, **kwargs)
+        finally:
+            _add_stage("serialization", time.perf_counter() - _started)
+
+    fastapi.routing.serialize_response = _timed_serialize_response
+
+    _render = JSONResponse.render
+
+    def _timed_render(self, content):
+        _started = time.perf_counter()
+        try:
+            return _render(self, content)
+        finally:
+            _add_stage("serialization", time.perf_counter() - _started)
+
+    JSONResponse.render = _timed_render
+
+    _publish = OUTBOX_RELAY._publish
+
+    async def _timed_publish(messages):
+        _started = time.perf_counter()
+        try:
+            return await _publish(messages)
+        finally:
+            _PUBLISH_SAMPLES.append(time.perf_counter() - _started)
+
+    OUTBOX_RELAY._publish = _timed_publish
+
+
+async def _setup(args) -> InMemoryBroker:
+    _dsn = args.dsn or f"sqlite+aiosqlite:///{args.sqlite_path}"
+    if not args.dsn and os.path.exists(args.sqlite_path):
+        os.remove(args.sqlite_path)
+    _engine = create_async_engine(
+        _dsn,
+        poolclass=_TimedPool,
+        pool_logging_name="bench",
+        pool_size=APP_SETTINGS.DATABASE.POOL_SIZE,
+        max_overflow=APP_SETTINGS.DATABASE.MAX_OVERFLOW,
+        pool_timeout=APP_SETTINGS.DATABASE.POOL_TIMEOUT,
+    )
+    if _engine.dialect.name == "sqlite":
+        @event.listens_for(_engine.sync_engine, "connect")
+        def _pragmas(connection, _):
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA busy_timeout=30000")
+
+    async with _engine.begin() as _connection:
+        await _connection.run_sync(BaseModel.metadata.create_all)
+    _install_hooks(_engine)
+
+    # every engine name, replicas included, is served by the benchmark database
+    _factory = async_sessionmaker(
+        bind=_engine, autoflush=False, autocommit=False, expire_on_commit=False
+    )
+    for _name in list(DB_HELPER._ENGINES):
+        DB_HELPER._ENGINES[_name] = _engine
+        DB_HELPER._SESSION_FACTORIES[_name] = _factory
+        DB_HELPER._SCOPED_SESSIONS[_name] = async_scoped_session(
+            _factory, scopefunc=asyncio.current_task
+        )
+    for _replica in DB_HELPER.replicas.replicas.values():
+        _replica.healthy = False
+
+    _broker = InMemoryBroker(rtt=args.broker_rtt_ms / 1000)
+    RMQ_Client.connection = _broker.connection()
+    return _broker
+
+
+def _percentiles(samples: list[float]) -> dict:
+    if not samples:
+        return {"count": 0}
+    _sorted = sorted(samples)
+
+    def _at(q: float) -> float:
+        return round(_sorted[min(len(_sorted) - 1, int(q * len(_sorted)))] * 1000, 3)
+
+    return {
+        "count": len(_sorted),
+        "mean_ms": round(sum(_sorted) / len(_sorted) * 1000, 3),
+        "p50_ms": _at(0.50),
+        "p90_ms": _at(0.90),
+        "p99_ms": _at(0.99),
+        "max_ms": round(_sorted[-1] * 1000, 3),
+    }
+
+
+async def _drive(client: httpx.AsyncClient, requests: int, concurrency: int, send) -> dict:
+    _latencies = []
+    _stages = defaultdict(list)
+    _errors = 0
+    _indexes = iter(range(requests))
+
+    async def _client():
+        nonlocal _errors
+        for i in _indexes:
+            _request_stages = defaultdict(float)
+            _token = _REQUEST_STAGES.set(_request_stages)
+            _started = time.perf_counter()
+            try:
+                _response = await send(client, i)
+                if _response.status_code >= 400:
+                    _errors += 1
+            except Exception:
+                _errors += 1
+            finally:
+                _latencies.append(time.perf_counter() - _started)
+                _REQUEST_STAGES.reset(_token)
+            for _stage, _seconds in _request_stages.items():
+                _stages[_stage].append(_seconds)
+
+    _started = time.perf_counter()
+    await asyncio.gather(*(_client() for _ in range(concurrency)))
+    _elapsed = time.perf_counter() - _started
+    return {
+        "requests": requests,
+        "errors": _errors,
+        "seconds": round(_elapsed, 3),
+        "requests_per_second": round(requests / _elapsed, 1),
+        "latency": _percentiles(_latencies),
+        "stages": {_stage: _percentiles(_samples) for _stage, _samples in sorted(_stages.items())},
+    }
+
+
+async def _create_users(client: httpx.AsyncClient, args) -> dict:
+    _run = uuid.uuid4().hex[:8]
+    _PUBLISH_SAMPLES.clear()
+    OUTBOX_RELAY.start()
+    _result = await _drive(
+        client,
+        args.requests,
+        args.concurrency,
+        lambda c, i: c.post(
+            "/user/user",
+            json={"name": f"bench {i}", "email": f"bench-{_run}-{i}@example.com", "phone": "+37400000000"},
+        ),
+    )
+    await OUTBOX_RELAY.stop()
+    while await OUTBOX_RELAY.relay_batch():
+        pass
+    _result["stages"]["publish"] = _percentiles(_PUBLISH_SAMPLES)
+    return _result
+
+
+async def _get_users(client: httpx.AsyncClient, args) -> dict:
+    _rows = [
+        {"uuid": uuid.uuid4(), "name": f"seed {i}", "email": f"seed-{i}@example.com", "phone": "+37400000000"}
+        for i in range(args.users)
+    ]
+    async with DB_HELPER._SESSION_FACTORIES["primary"]() as db:
+        await db.execute(insert(User), _rows)
+        await db.commit()
+    _ids = [str(_row["uuid"]) for _row in _rows]
+    return await _drive(
+        client,
+        args.requests,
+        args.concurrency,
+        lambda c, i: c.request("GET", "/user/user", json={"user_id": _ids[i % len(_ids)]}),
+    )
+
+
+SCENARIOS = {"create_user": _create_users, "get_user": _get_users}
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_results(results: dict):
+    print(f"{'scenario':>12}{'stage':>15}{'count':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for _name, _result in results["scenarios"].items():
+        print(
+            f"{_name:>12}: {_result['requests_per_second']:,.1f} req/s, "
+            f"{_result['errors']} errors in {_result['seconds']}s"
+        )
+        for _stage, _stats in [("request", _result["latency"]), *_result["stages"].items()]:
+            if not _stats["count"]:
+                continue
+            print(
+                f"{'':>12}{_stage:>15}{_stats['count']:>8}{_stats['p50_ms']:>10.3f}"
+                f"{_stats['p90_ms']:>10.3f}{_stats['p99_ms']:>10.3f}{_stats['max_ms']:>10.3f}"
+            )
+
+
+def _compare(baseline: dict, results: dict, threshold: float) -> list[str]:
+    """Print the change of every headline metric and return the ones that regressed."""
+    _regressions = []
+    print(f"\ncompared with {baseline['meta'].get('git') or 'baseline'} of {baseline['meta']['timestamp']}")
+    for _key in ("database", "requests", "concurrency", "users", "cache", "broker_rtt_ms"):
+        if baseline["meta"].get(_key) != results["meta"][_key]:
+            print(f"note: {_key} was {baseline['meta'].get(_key)}, now {results['meta'][_key]}")
+    print(f"{'scenario':>12}{'metric':>28}{'baseline':>12}{'current':>12}{'change':>10}")
+    for _name, _result in results["scenarios"].items():
+        _base = baseline["scenarios"].get(_name)
+        if _base is None:
+            continue
+        _metrics = [("requests_per_second", _base["requests_per_second"], _result["requests_per_second"], True)]
+        for _stage, _stats in [("request", _result["latency"]), *_result["stages"].items()]:
+            _base_stats = _base["latency"] if _stage == "request" else _base["stages"].get(_stage)
+            if not _base_stats or not _base_stats["count"] or not _stats["count"]:
+                continue
+            for _p in ("p50_ms", "p99_ms"):
+                _metrics.append((f"{_stage} {_p}", _base_stats[_p], _stats[_p], False))
+        for _metric, _before, _after, _higher_is_better in _metrics:
+            _change = (_after - _before) / _before * 100 if _before else 0.0
+            _worse = -_change if _higher_is_better else _change
+            # stages only explain a regression; throughput and request latency define one
+            _headline = _metric == "requests_per_second" or _metric.startswith("request ")
+            _flag = ""
+            if _worse > threshold:
+                _flag = "  REGRESSION" if _headline else "  slower"
+                if _headline:
+                    _regressions.append(f"{_name} {_metric}")
+            print(f"{_name:>12}{_metric:>28}{_before:>12,.3f}{_after:>12,.3f}{_change:>+9.1f}%{_flag}")
+    return _regressions
+
+
+async def main(args) -> int:
+    APP_SETTINGS.CACHE.USER_CACHE_ENABLED = not args.no_cache
+    _broker = await _setup(args)
+    _transport = httpx.ASGITransport(app=app)
+    _results = {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "git": _git_revision(),
+            "python": platform.python_version(),
+            "database": DB_HELPER._ENGINES["primary"].dialect.name,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "users": args.users,
+            "cache": not args.no_cache,
+            "broker_rtt_ms": args.broker_rtt_ms,
+        },
+        "scenarios": {},
+    }
+    async with httpx.AsyncClient(transport=_transport, base_url="http://bench") as _client:
+        for _name in args.scenarios:
+            _results["scenarios"][_name] = await SCENARIOS[_name](_client, args)
+    _results["meta"]["published"] = len(_broker.published)
+    await RMQ_Client.publisher.close()
+
+    _print_results(_results)
+    if args.save:
+        with open(args.save, "w") as _file:
+            json.dump(_results, _file, indent=2)
+        print(f"\nsaved to {args.save}")
+    if args.compare:
+        with open(args.compare) as _file:
+            _regressions = _compare(json.load(_file), _results, args.threshold)
+        if _regressions:
+            print(f"\n{len(_regressions)} regressions beyond {args.threshold}%: {', '.join(_regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    _parser = argparse.ArgumentParser()
+    _parser.add_argument("--requests", type=int, default=2000)
+    _parser.add_argument("--concurrency", type=int, default=50)
+    _parser.add_argument("--users", type=int, default=1000, help="users seeded for get_user")
+    _parser.add_argument("--scenarios", nargs="*", choices=list(SCENARIOS), default=list(SCENARIOS))
+    _parser.add_argument("--dsn", default=None, help="async SQLAlchemy URL of a local Postgres")
+    _parser.add_argument("--sqlite-path", default="/tmp/walle-bench.db")
+    _parser.add_argument("--no-cache", action="store_true", help="disable the user read cache")
+    _parser.add_argument("--broker-rtt-ms", type=float, default=0.5)
+    _parser.add_argument("--save", default=None, help="write the results as a JSON baseline")
+    _parser.add_argument("--compare", default=None, help="compare with a saved JSON baseline")
+    _parser.add_argument("--threshold", type=float, default=10, help="regression threshold in percent")
+    sys.exit(asyncio.run(main(_parser.parse_args())))
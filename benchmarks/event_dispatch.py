@@ -0,0 +1,58 @@
+"""Per-event dispatch overhead of the ``EventRegistry`` with no-op handlers.
+
+Registers ``--events`` event types, each with one handler and a small schema,
+and reports the cost of validating and dispatching every message.
+
+    python -m benchmarks.event_dispatch --messages 100000 --events 12 --batch-size 1
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+from pydantic import BaseModel
+
+from app.helpers.events import EventRegistry
+
+
+class BenchUser(BaseModel):
+    uuid: uuid.UUID
+    name: str
+    email: str
+
+
+class BenchEvent(BaseModel):
+    users: list[BenchUser]
+
+
+async def _noop(db, event):
+    return None
+
+
+async def main(args):
+    _registry = EventRegistry("bench")
+    for i in range(args.events):
+        _registry.on(f"event_{i}", BenchEvent)(_noop)
+    _payloads = [
+        {
+            "event": f"event_{i % args.events}",
+            "users": [{"uuid": str(uuid.uuid4()), "name": "bench", "email": "bench@example.com"}],
+        }
+        for i in range(args.messages)
+    ]
+    _started = time.perf_counter()
+    for i in range(0, args.messages, args.batch_size):
+        await _registry.dispatch(None, _payloads[i:i + args.batch_size])
+    _elapsed = time.perf_counter() - _started
+    print(
+        f"{args.messages:,} messages over {args.events} events, batch {args.batch_size}: "
+        f"{_elapsed / args.messages * 1e6:.2f} us/message, {args.messages / _elapsed:,.0f} msg/s"
+    )
+
+
+if __name__ == "__main__":
+    _parser = argparse.ArgumentParser()
+    _parser.add_argument("--messages", type=int, default=100000)
+    _parser.add_argument("--events", type=int, default=12)
+    _parser.add_argument("--batch-size", type=int, default=1)
+    asyncio.run(main(_parser.parse_args()))
@@ -0,0 +1,62 @@
+"""Per-request authentication overhead, with and without the verified-token cache.
+
+Runs the ``Authorization`` header through ``security_bearer`` and
+``get_user_organization`` the way FastAPI does for every authenticated request.
+``--tokens`` distinct clients take turns, each resending its own token.
+
+    python -m benchmarks.jwt_auth --requests 100000 --tokens 100
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+from starlette.requests import Request
+
+from app.helpers.cryptography import TOKEN_CACHE, create_access_token
+from app.helpers.middlewares import get_user_organization, security_bearer
+from app.settings import APP_SETTINGS
+
+
+def _request(token: str) -> Request:
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": "/",
+            "headers": [(b"authorization", f"Bearer {token}".encode())],
+        }
+    )
+
+
+async def _run(requests: list[Request]) -> float:
+    _started = time.perf_counter()
+    for _request_ in requests:
+        await get_user_organization(await security_bearer(_request_))
+    return (time.perf_counter() - _started) / len(requests) * 1e6
+
+
+async def main(args):
+    _tokens = [
+        create_access_token({"organizationId": str(uuid.uuid4()), "sub": str(uuid.uuid4())})
+        for _ in range(args.tokens)
+    ]
+    _requests = [_request(_tokens[i % args.tokens]) for i in range(args.requests)]
+
+    APP_SETTINGS.JWT.JWT_CACHE_ENABLED = False
+    _uncached = await _run(_requests)
+    APP_SETTINGS.JWT.JWT_CACHE_ENABLED = True
+    TOKEN_CACHE.clear()
+    _cached = await _run(_requests)
+
+    print(f"{'mode':>10}{'us/request':>14}")
+    print(f"{'decode':>10}{_uncached:>14.2f}")
+    print(f"{'cached':>10}{_cached:>14.2f}")
+    print(f"cache hits {TOKEN_CACHE.claims.hits:,}, misses {TOKEN_CACHE.claims.misses:,}")
+
+
+if __name__ == "__main__":
+    _parser = argparse.ArgumentParser()
+    _parser.add_argument("--requests", type=int, default=100_000)
+    _parser.add_argument("--tokens", type=int, default=100)
+    asyncio.run(main(_parser.parse_args()))
@@ -0,0 +1,96 @@
+"""Publisher throughput against an in-memory broker stand-in.
+
+Compares the previous publish path (declare queue + declare exchange + publish
+on one shared channel, per message) with the pooled ``Publisher``.
+
+    python -m benchmarks.publisher_throughput --messages 5000 --concurrency 100 --rtt-ms 0.5
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from aio_pika import DeliveryMode, Message
+
+from app.helpers.publisher import Publisher
+from benchmarks.stubs import InMemoryBroker
+
+EXCHANGE = "walle"
+QUEUE = "bench-queue"
+ROUTING_KEY = "user_created"
+BODY = json.dumps({"event": "user_created", "users": [{"name": "bench"}]}).encode()
+
+
+async def _bounded(concurrency: int, messages: int, publish):
+    _semaphore = asyncio.Semaphore(concurrency)
+
+    async def _one():
+        async with _semaphore:
+            await publish()
+
+    await asyncio.gather(*(_one() for _ in range(messages)))
+
+
+async def bench_per_message_declare(broker: InMemoryBroker, messages: int, concurrency: int):
+    _channel = await broker.connection().channel(publisher_confirms=True)
+
+    async def _publish():
+        await _channel.declare_queue(QUEUE, durable=True)
+        _exchange = await _channel.declare_exchange(EXCHANGE)
+        await _exchange.publish(
+            Message(BODY, delivery_mode=DeliveryMode.NOT_PERSISTENT), ROUTING_KEY
+        )
+
+    await _bounded(concurrency, messages, _publish)
+
+
+async def bench_publisher(broker: InMemoryBroker, messages: int, concurrency: int, confirms: bool):
+    _connection = broker.connection()
+    _publisher = Publisher(lambda: _connection, pool_size=4, publisher_confirms=confirms)
+    await _bounded(
+        concurrency, messages, lambda: _publisher.publish(ROUTING_KEY, BODY, exchange=EXCHANGE)
+    )
+    await _publisher.close()
+
+
+async def bench_publisher_batch(broker: InMemoryBroker, messages: int, batch_size: int):
+    _connection = broker.connection()
+    _publisher = Publisher(lambda: _connection, pool_size=4, publisher_confirms=True)
+    for i in range(0, messages, batch_size):
+        await _publisher.publish_batch(
+            [(ROUTING_KEY, BODY, {})] * min(batch_size, messages - i), exchange=EXCHANGE
+        )
+    await _publisher.close()
+
+
+async def main(args):
+    _cases = {
+        "declare per message": lambda b: bench_per_message_declare(
+            b, args.messages, args.concurrency
+        ),
+        "publisher, confirms": lambda b: bench_publisher(
+            b, args.messages, args.concurrency, confirms=True
+        ),
+        "publisher, no confirms": lambda b: bench_publisher(
+            b, args.messages, args.concurrency, confirms=False
+        ),
+        f"publisher batch of {args.batch_size}": lambda b: bench_publisher_batch(
+            b, args.messages, args.batch_size
+        ),
+    }
+    print(f"{'case':<28}{'msg/s':>12}{'round trips':>14}")
+    for _name, _case in _cases.items():
+        _broker = InMemoryBroker(rtt=args.rtt_ms / 1000)
+        _started = time.perf_counter()
+        await _case(_broker)
+        _elapsed = time.perf_counter() - _started
+        print(f"{_name:<28}{args.messages / _elapsed:>12,.0f}{_broker.round_trips:>14,}")
+
+
+if __name__ == "__main__":
+    _parser = argparse.ArgumentParser()
+    _parser.add_argument("--messages", type=int, default=5000)
+    _parser.add_argument("--concurrency", type=int, default=100)
+    _parser.add_argument("--batch-size", type=int, default=100)
+    _parser.add_argument("--rtt-ms", type=float, default=0.5)
+    asyncio.run(main(_parser.parse_args()))
@@ -0,0 +1,89 @@
+"""In-memory stand-ins for external services used by the benchmarks."""
+import asyncio
+
+
+class InMemoryExchange:
+    def __init__(self, broker: "InMemoryBroker", channel: "InMemoryChannel", name: str):
+        self.broker = broker
+        self.channel = channel
+        self.name = name
+
+    async def publish(self, message, routing_key: str):
+        self.broker.published.append((self.name, routing_key, message))
+        if self.channel.publisher_confirms:
+            # confirms are pipelined: many can be outstanding on one channel
+            await asyncio.sleep(self.broker.rtt)
+
+
+class InMemoryQueue:
+    def __init__(self, broker: "InMemoryBroker", name: str):
+        self.broker = broker
+        self.name = name
+
+    async def bind(self, exchange, routing_key: str):
+        await self.broker.rpc()
+
+    async def consume(self, callback):
+        self.broker.consumers.append((self.name, callback))
+
+
+class InMemoryChannel:
+    def __init__(self, broker: "InMemoryBroker", publisher_confirms: bool = True):
+        self.broker = broker
+        self.publisher_confirms = publisher_confirms
+        self.is_closed = False
+        # synchronous AMQP methods (declare, bind, qos) are serialized per channel
+        self._rpc_lock = asyncio.Lock()
+
+    async def _rpc(self):
+        async with self._rpc_lock:
+            await self.broker.rpc()
+
+    async def declare_exchange(self, name: str, *args, **kwargs):
+        await self._rpc()
+        return InMemoryExchange(self.broker, self, name)
+
+    async def get_exchange(self, name: str, ensure: bool = True):
+        if ensure:
+            await self._rpc()
+        return InMemoryExchange(self.broker, self, name)
+
+    async def declare_queue(self, name: str = "", *args, **kwargs):
+        await self._rpc()
+        return InMemoryQueue(self.broker, name)
+
+    async def set_qos(self, *args, **kwargs):
+        await self._rpc()
+
+    async def close(self):
+        self.is_closed = True
+
+
+class InMemoryConnection:
+    def __init__(self, broker: "InMemoryBroker"):
+        self.broker = broker
+        self.is_open = True
+
+    async def channel(self, publisher_confirms: bool = True, **kwargs):
+        await self.broker.rpc()
+        return InMemoryChannel(self.broker, publisher_confirms=publisher_confirms)
+
+    async def close(self):
+        self.is_open = False
+
+
+class InMemoryBroker:
+    """Records published messages and charges ``rtt`` seconds per broker round trip."""
+
+    def __init__(self, rtt: float = 0.0005):
+        self.rtt = rtt
+        self.round_trips = 0
+        self.published = []
+        self.consumers = []
+
+    async def rpc(self):
+        self.round_trips += 1
+        await asyncio.sleep(self.rtt)
+
+    def connection(self) -> InMemoryConnection:
+        return InMemoryConnection(self)
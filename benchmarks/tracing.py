@@ -0,0 +1,46 @@
+"""Per-span overhead of ``traced`` on an empty coroutine.
+
+Compares a bare call with a traced call outside a trace (unsampled requests)
+and inside one (sampled requests, including the histogram observation).
+
+    python -m benchmarks.tracing --calls 200000
+"""
+import argparse
+import asyncio
+import time
+
+from app.helpers.tracing import TRACE, Trace, traced
+
+
+async def _noop():
+    return None
+
+
+_traced_noop = traced("bench", "noop")(_noop)
+
+
+async def _time(func, calls: int) -> float:
+    _started = time.perf_counter()
+    for _ in range(calls):
+        await func()
+    return (time.perf_counter() - _started) / calls * 1e6
+
+
+async def main(args):
+    _bare = await _time(_noop, args.calls)
+    _unsampled = await _time(_traced_noop, args.calls)
+    _trace = Trace()
+    _reset = TRACE.set(_trace)
+    _sampled = await _time(_traced_noop, args.calls)
+    TRACE.reset(_reset)
+
+    print(f"{'call':>12}{'us/call':>10}{'overhead us':>14}")
+    print(f"{'bare':>12}{_bare:>10.3f}{'':>14}")
+    print(f"{'unsampled':>12}{_unsampled:>10.3f}{_unsampled - _bare:>14.3f}")
+    print(f"{'sampled':>12}{_sampled:>10.3f}{_sampled - _bare:>14.3f}")
+
+
+if __name__ == "__main__":
+    _parser = argparse.ArgumentParser()
+    _parser.add_argument("--calls", type=int, default=200_000)
+    asyncio.run(main(_parser.parse_args()))